@@ -0,0 +1,112 @@
+"""Benchmark of the KPI SQL queries against the NumPy column store.
+
+Builds a synthetic SQLite database (10M invoice lines by default), then times
+the SQL path, the column store load and the vectorized KPIs, and checks that
+both paths return the same results.
+
+Usage:
+    python back/benchmarks/bench_analytics_store.py [--lines 10000000]
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+import models
+from services.analytics_store import ColumnStore
+from services.reports_logic import basket_size_distribution, revenue_per_category_week
+
+CATEGORIES = ["Boissons", "Épicerie", "Frais", "Hygiène", "Snacks", None]
+
+
+def build_database(path, lines, products=5000, users=200_000, lines_per_invoice=4):
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=engine)
+    engine.dispose()
+
+    rng = np.random.default_rng(42)
+    invoices = lines // lines_per_invoice
+    start = datetime(2024, 1, 1)
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.executemany(
+        "INSERT INTO products (id, name, category, price, available_quantity) VALUES (?, ?, ?, ?, ?)",
+        (
+            (i, f"Produit {i}", CATEGORIES[i % len(CATEGORIES)], round(1 + i % 50 * 0.37, 2), 10)
+            for i in range(1, products + 1)
+        ),
+    )
+
+    user_ids = rng.integers(1, users + 1, invoices)
+    seconds = rng.integers(0, 365 * 86400, invoices)
+    conn.executemany(
+        "INSERT INTO invoices (id, user_id, total_price, created_at) VALUES (?, ?, 0, ?)",
+        (
+            (i + 1, int(u), str(start + timedelta(seconds=int(s))))
+            for i, (u, s) in enumerate(zip(user_ids, seconds))
+        ),
+    )
+
+    invoice_ids = np.repeat(np.arange(1, invoices + 1), lines_per_invoice)
+    product_ids = rng.integers(1, products + 1, len(invoice_ids))
+    quantities = rng.integers(1, 6, len(invoice_ids))
+    prices = np.round(1 + (product_ids % 50) * 0.37, 2)
+    conn.executemany(
+        "INSERT INTO products_list (invoice_id, product_id, quantity, unit_price_at_sale) VALUES (?, ?, ?, ?)",
+        zip(invoice_ids.tolist(), product_ids.tolist(), quantities.tolist(), prices.tolist()),
+    )
+    conn.commit()
+    conn.close()
+
+
+def timed(label, fn):
+    started = time.perf_counter()
+    result = fn()
+    print(f"{label:<40} {time.perf_counter() - started:8.2f} s")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, default=10_000_000)
+    parser.add_argument("--db", help="reuse an existing benchmark database")
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(tempfile.mkdtemp(), "bench_analytics.db")
+    if not os.path.exists(path):
+        timed(f"seed {args.lines} lines", lambda: build_database(path, args.lines))
+
+    session = sessionmaker(bind=create_engine(f"sqlite:///{path}"))()
+    try:
+        sql_baskets = timed("SQL basket size distribution", lambda: basket_size_distribution(session))
+        sql_revenue = timed("SQL revenue per category/week", lambda: revenue_per_category_week(session))
+
+        store = ColumnStore()
+        timed("column store load", lambda: store.load(session))
+        np_baskets = timed("NumPy basket size distribution", store.basket_size_distribution)
+        np_revenue = timed("NumPy revenue per category/week", store.revenue_per_category_week)
+
+        same = sql_baskets == np_baskets and sql_revenue == np_revenue
+        print("✅ Résultats identiques" if same else "❌ Résultats différents")
+        print(f"Base de benchmark : {path}")
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""Benchmark of GET /invoices/me on AsyncSession against a blocking sync Session.
+
+Drives the app in-process with concurrent clients, once through the ported
+route and once through the same query on a sync Session inside `async def`
+(the previous pattern), while a probe times GET / to show event loop stalls.
+
+Usage:
+    python back/benchmarks/bench_async_db.py [--clients 32] [--seconds 10]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import httpx
+from fastapi import Depends
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, selectinload, sessionmaker
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+import models
+from db import get_async_read_db, get_db
+from main import app
+from services.auth_logic import Principal, get_current_user
+
+PRINCIPAL = Principal(id=1, email="bench@trinity.local", first_name="Bench", last_name="Async", role="client")
+
+
+def build_database(path, invoices=40, lines_per_invoice=5):
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add(models.User(id=1, first_name="Bench", last_name="Async", email=PRINCIPAL.email, password="x"))
+    session.add_all(models.Product(id=i, name=f"Produit {i}", price=2.5, available_quantity=10) for i in range(1, 51))
+    start = datetime(2024, 1, 1)
+    for i in range(invoices):
+        invoice = models.Invoice(user_id=1, total_price=12.5, created_at=start + timedelta(days=i))
+        invoice.details = [
+            models.ProductsList(product_id=1 + (i + j) % 50, quantity=1, unit_price_at_sale=2.5)
+            for j in range(lines_per_invoice)
+        ]
+        session.add(invoice)
+    session.commit()
+    session.close()
+
+
+def blocking_invoices(current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    async def route():
+        invoices = (
+            db.query(models.Invoice)
+            .options(selectinload(models.Invoice.details).selectinload(models.ProductsList.product))
+            .filter(models.Invoice.user_id == current_user.id)
+            .order_by(models.Invoice.created_at.desc())
+            .all()
+        )
+        return [
+            {"id": inv.id, "items": [{"id": d.id, "product_name": d.product.name} for d in inv.details]}
+            for inv in invoices
+        ]
+
+    return route
+
+
+@app.get("/bench/blocking-invoices")
+async def read_blocking_invoices(route=Depends(blocking_invoices)):
+    return await route()
+
+
+async def load(client, url, clients, seconds):
+    latencies = []
+    probe = []
+    deadline = time.perf_counter() + seconds
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = await client.get(url)
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    async def prober():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            await client.get("/")
+            probe.append((time.perf_counter() - started) * 1000)
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(prober(), *(worker() for _ in range(clients)))
+    latencies.sort()
+    probe.sort()
+    return {
+        "requests_per_s": len(latencies) / seconds,
+        "p95_ms": latencies[int(len(latencies) * 0.95)],
+        "probe_p95_ms": probe[int(len(probe) * 0.95)],
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench_async_db.db")
+    build_database(path)
+    # The blocking route checks connections out on the event loop thread: with
+    # fewer connections than clients, a waiting checkout stalls the loop that
+    # would release the others until the pool timeout.
+    sync_engine = create_engine(
+        f"sqlite:///{path}", connect_args={"check_same_thread": False}, pool_size=args.clients + 1
+    )
+    SyncSession = sessionmaker(bind=sync_engine)
+    AsyncSession = async_sessionmaker(create_async_engine(f"sqlite+aiosqlite:///{path}"), expire_on_commit=False)
+
+    def bench_db():
+        db = SyncSession()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    async def bench_async_db():
+        async with AsyncSession() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = bench_db
+    app.dependency_overrides[get_async_read_db] = bench_async_db
+    app.dependency_overrides[get_current_user] = lambda: PRINCIPAL
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"{args.clients} clients, {args.seconds:g} s par mesure")
+        print(f"{'route':<28} {'req/s':>8} {'p95':>10} {'GET / p95':>12}")
+        for label, url in (
+            ("sync Session (bloquant)", "/bench/blocking-invoices"),
+            ("AsyncSession", "/invoices/me"),
+        ):
+            result = await load(client, url, args.clients, args.seconds)
+            print(
+                f"{label:<28} {result['requests_per_s']:>8.1f} "
+                f"{result['p95_ms']:>7.1f} ms {result['probe_p95_ms']:>9.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,357 @@
+"""Benchmark suite of the hot endpoints over synthetic databases at several scales.
+
+Each scale is a SQLite database seeded once in --data-dir and reused by later
+runs. For each scale, a fresh interpreter pointed at that database
+(TRINITY_DATABASE_URL) calls every endpoint in-process: --warmup requests,
+then --requests timed ones from --concurrency clients. Latency percentiles
+and throughput are appended to --output as JSON lines tagged with the git
+commit; --compare REF prints the change from the last run recorded for that
+commit, so a regression shows up between two commits.
+
+Scales (products / invoices / customers):
+    small      1 000 /    10 000 /   1 000
+    medium   100 000 /   100 000 /  10 000
+    large  1 000 000 / 1 000 000 / 100 000
+
+Checkout doesn't call PayPal: the capture is replaced by a completed one.
+
+Usage:
+    python back/benchmarks/bench_endpoints.py [--scales small,medium] [--requests 200] [--concurrency 1] [--compare HEAD~1]
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+SCALES = {
+    "small": {"products": 1_000, "invoices": 10_000, "customers": 1_000},
+    "medium": {"products": 100_000, "invoices": 100_000, "customers": 10_000},
+    "large": {"products": 1_000_000, "invoices": 1_000_000, "customers": 100_000},
+}
+MANAGER_ID = 1
+CUSTOMER_ID = 2  # an ordinary customer, with a seeded history
+CHECKOUT_ID = 3  # places the benchmark's orders, so CUSTOMER_ID's history doesn't grow
+PASSWORD = "bench-password"
+LINES_PER_INVOICE = 3
+CATEGORIES = [f"Rayon {i}" for i in range(20)]
+BRANDS = [f"Marque {i}" for i in range(50)]
+WORDS = ["pomme", "lait", "pain", "chocolat", "riz", "café", "yaourt", "pâtes", "jus", "fromage"]
+BATCH = 20_000
+
+# Slow requests are expected at the large scales: don't log each of them.
+CHILD_ENV = {
+    "TRINITY_SLOW_REQUEST_MS": "1e9",
+    "TRINITY_SLOW_REQUEST_QUERIES": "1000000",
+    "TRINITY_LOGIN_LIMIT_PER_EMAIL": "1000000",
+    "TRINITY_LOGIN_LIMIT_PER_IP": "1000000",
+}
+
+
+def seed(path, scale):
+    """Builds the database at `path` for `scale`; written under a temporary name, then renamed."""
+    from sqlalchemy import insert
+    from sqlalchemy.orm import Session
+
+    import models
+    from db import create_configured_engine
+    from migrations import upgrade
+    from services.customer_sketches import rebuild_sketches
+    from services.customer_stats import rebuild_customer_stats
+    from services.passwords import pwd_context
+
+    partial = f"{path}.partial"
+    if os.path.exists(partial):
+        os.remove(partial)
+    engine = create_configured_engine(f"sqlite:///{partial}")
+    upgrade(engine)
+    rng = random.Random(42)
+    counts = SCALES[scale]
+    started = time.perf_counter()
+
+    def insert_rows(table, rows):
+        batch = []
+        with engine.begin() as conn:
+            for row in rows:
+                batch.append(row)
+                if len(batch) == BATCH:
+                    conn.execute(insert(table), batch)
+                    batch = []
+            if batch:
+                conn.execute(insert(table), batch)
+
+    hashed = pwd_context.hash(PASSWORD)
+    start = datetime(2024, 1, 1)
+    special = {
+        MANAGER_ID: ("Alice", "Manager", "manager@bench.local", "manager"),
+        CUSTOMER_ID: ("Bob", "Client", "client@bench.local", "client"),
+        CHECKOUT_ID: ("Chloé", "Commande", "checkout@bench.local", "client"),
+    }
+
+    def user_row(user_id):
+        first_name, last_name, email, role = special.get(
+            user_id, (f"Prénom{user_id}", f"Nom{user_id}", f"client{user_id}@bench.local", "client")
+        )
+        return {
+            "id": user_id,
+            "first_name": first_name,
+            "last_name": last_name,
+            "email": email,
+            "password": hashed if user_id in special else "x",
+            "role": role,
+            "created_at": start - timedelta(minutes=user_id),
+        }
+
+    insert_rows(models.User.__table__, (user_row(user_id) for user_id in range(1, counts["customers"] + 1)))
+    insert_rows(
+        models.Product.__table__,
+        (
+            {
+                "id": product_id,
+                "off_id": str(3_000_000_000_000 + product_id),
+                "name": f"{WORDS[product_id % len(WORDS)]} {product_id}",
+                "brand": BRANDS[product_id % len(BRANDS)],
+                "category": CATEGORIES[product_id % len(CATEGORIES)],
+                "price": round(rng.uniform(0.5, 30), 2),
+                "available_quantity": 1_000_000_000,
+            }
+            for product_id in range(1, counts["products"] + 1)
+        ),
+    )
+    seconds = 365 * 24 * 3600
+    insert_rows(
+        models.Invoice.__table__,
+        (
+            {
+                "id": invoice_id,
+                # CUSTOMER_ID gets the average history; CHECKOUT_ID starts with none.
+                "user_id": CUSTOMER_ID
+                if invoice_id % counts["customers"] == 0
+                else rng.randint(CHECKOUT_ID + 1, counts["customers"]),
+                "total_price": 0.0,
+                "created_at": start + timedelta(seconds=rng.randrange(seconds)),
+            }
+            for invoice_id in range(1, counts["invoices"] + 1)
+        ),
+    )
+    insert_rows(
+        models.ProductsList.__table__,
+        (
+            {
+                "invoice_id": invoice_id,
+                "product_id": rng.randint(1, counts["products"]),
+                "quantity": rng.randint(1, 3),
+                "unit_price_at_sale": round(rng.uniform(0.5, 30), 2),
+            }
+            for invoice_id in range(1, counts["invoices"] + 1)
+            for _ in range(LINES_PER_INVOICE)
+        ),
+    )
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "UPDATE invoices SET total_price = ("
+            "SELECT ROUND(SUM(quantity * unit_price_at_sale), 2) FROM products_list WHERE invoice_id = invoices.id)"
+        )
+    with Session(bind=engine) as db:
+        rebuild_customer_stats(db)
+        rebuild_sketches(db)
+    engine.dispose()
+    os.replace(partial, path)
+    print(f"   base {scale} créée en {time.perf_counter() - started:.0f} s : {path}", file=sys.stderr)
+
+
+def endpoints(scale):
+    """(name, method, url factory, request kwargs, requests cap): every hot endpoint."""
+    from services.auth_logic import create_access_token
+
+    counts = SCALES[scale]
+    rng = random.Random(7)
+
+    def bearer(user_id, email, role):
+        token = create_access_token({"sub": email, "uid": user_id, "role": role, "ver": 0})
+        return {"headers": {"Authorization": f"Bearer {token}"}}
+
+    manager = bearer(MANAGER_ID, "manager@bench.local", "manager")
+    customer = bearer(CUSTOMER_ID, "client@bench.local", "client")
+    checkout_customer = bearer(CHECKOUT_ID, "checkout@bench.local", "client")
+    pages = max(counts["products"] // 20, 1)
+
+    def checkout_body():
+        items = [{"product_id": rng.randint(1, counts["products"]), "quantity": 1} for _ in range(LINES_PER_INVOICE)]
+        billing = {"first_name": "Chloé", "last_name": "Commande", "address": "1 rue du Banc", "zip_code": "75000", "city": "Paris"}
+        return {**checkout_customer, "json": {"items": items, "billing": billing, "paypal_order_id": "BENCH"}}
+
+    return [
+        ("products_list", "GET", lambda: f"/products/?page={rng.randint(1, min(pages, 50))}", lambda: {}, None),
+        ("products_sorted", "GET", lambda: "/products/?sort_by=price&sort_order=desc", lambda: {}, None),
+        ("products_filter", "GET", lambda: f"/products/?q={rng.choice(WORDS)}", lambda: {}, None),
+        ("products_search", "GET", lambda: f"/products/search/{rng.choice(WORDS)}", lambda: {}, None),
+        ("products_scan", "GET", lambda: f"/products/scan/{3_000_000_000_000 + rng.randint(1, counts['products'])}", lambda: {}, None),
+        ("invoices_me", "GET", lambda: "/invoices/me", lambda: customer, None),
+        ("user_detail", "GET", lambda: f"/users/{rng.randint(CHECKOUT_ID + 1, counts['customers'])}", lambda: manager, None),
+        ("reports", "GET", lambda: "/reports", lambda: manager, None),
+        # A login hashes a password (about 250 ms of CPU): fewer of them.
+        (
+            "login",
+            "POST",
+            lambda: "/auth/login",
+            lambda: {"data": {"username": "client@bench.local", "password": PASSWORD}},
+            20,
+        ),
+        ("checkout", "POST", lambda: "/invoices/checkout", checkout_body, None),
+    ]
+
+
+def measure(client, method, url, kwargs, count, concurrency):
+    def call(_):
+        request_url, request_kwargs = url(), kwargs()
+        started = time.perf_counter()
+        response = client.request(method, request_url, **request_kwargs)
+        return time.perf_counter() - started, response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = list(executor.map(call, range(count)))
+    wall = time.perf_counter() - started
+    latencies = sorted(seconds * 1000 for seconds, _ in results)
+
+    def percentile(fraction):
+        return round(latencies[min(int(len(latencies) * fraction), len(latencies) - 1)], 3)
+
+    return {
+        "requests": count,
+        "errors": sum(status >= 400 for _, status in results),
+        "mean_ms": round(statistics.fmean(latencies), 3),
+        "p50_ms": percentile(0.5),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "throughput_rps": round(count / wall, 1),
+    }
+
+
+def run_scale(scale, args):
+    """Runs in the child interpreter, whose db engines point at the scale's database."""
+    from fastapi.testclient import TestClient
+
+    import main
+    from routes import invoices
+
+    invoices._paypal_capture_order = lambda order_id: {"status": "COMPLETED", "id": order_id}
+    results = []
+    with TestClient(main.app) as client:
+        for name, method, url, kwargs, cap in endpoints(scale):
+            count = min(args.requests, cap) if cap else args.requests
+            measure(client, method, url, kwargs, min(args.warmup, count), args.concurrency)
+            result = measure(client, method, url, kwargs, count, args.concurrency)
+            results.append({"endpoint": name, **result})
+            print(f"   {scale:<7} {name:<16} p50 {result['p50_ms']:>9.2f} ms", file=sys.stderr)
+    print(json.dumps(results))
+
+
+def git_commit():
+    def git(*command):
+        return subprocess.run(["git", *command], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+
+    commit = git("rev-parse", "--short", "HEAD") or "unknown"
+    return commit + ("-dirty" if git("status", "--porcelain", "--untracked-files=no") else "")
+
+
+def load_results(path):
+    if not path.exists():
+        return []
+    with open(path) as handle:
+        return [json.loads(line) for line in handle if line.strip()]
+
+
+def print_results(records, previous, reference):
+    print(f"\n{'échelle':<8} {'endpoint':<16} {'p50 (ms)':>10} {'p95 (ms)':>10} {'req/s':>8} {'erreurs':>8}", end="")
+    print(f" {'p50 vs ' + reference:>16}" if reference else "")
+    for record in records:
+        line = (
+            f"{record['scale']:<8} {record['endpoint']:<16} {record['p50_ms']:>10.2f} {record['p95_ms']:>10.2f}"
+            f" {record['throughput_rps']:>8.1f} {record['errors']:>8}"
+        )
+        if reference:
+            before = previous.get((record["scale"], record["endpoint"]))
+            line += f" {(record['p50_ms'] / before['p50_ms'] - 1) * 100:>+15.1f}%" if before else f" {'-':>16}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scales", default="small", help=f"parmi {', '.join(SCALES)}")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "trinity-bench"))
+    parser.add_argument("--output", default=str(ROOT / "benchmarks" / "results" / "endpoints.jsonl"))
+    parser.add_argument("--compare", metavar="REF", help="commit dont les derniers résultats servent de référence")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        path = os.path.join(args.data_dir, f"{args.child}.db")
+        if not os.path.exists(path):
+            seed(path, args.child)
+        run_scale(args.child, args)
+        return
+
+    scales = args.scales.split(",")
+    unknown = [scale for scale in scales if scale not in SCALES]
+    if unknown:
+        parser.error(f"échelles inconnues : {', '.join(unknown)}")
+    os.makedirs(args.data_dir, exist_ok=True)
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    commit = git_commit()
+    recorded_at = datetime.utcnow().isoformat(timespec="seconds")
+
+    records = []
+    for scale in scales:
+        env = {
+            **os.environ,
+            **CHILD_ENV,
+            "TRINITY_DATABASE_URL": f"sqlite:///{os.path.join(args.data_dir, scale + '.db')}",
+        }
+        stdout = subprocess.run(
+            [sys.executable, __file__, *sys.argv[1:], "--child", scale],
+            cwd=ROOT,
+            env=env,
+            stdout=subprocess.PIPE,
+            text=True,
+            check=True,
+        ).stdout
+        for result in json.loads(stdout.strip().splitlines()[-1]):
+            records.append(
+                {"commit": commit, "recorded_at": recorded_at, "scale": scale, "concurrency": args.concurrency, **result}
+            )
+
+    # Read before appending, so --compare HEAD compares with the previous run.
+    previous = {}
+    if args.compare:
+        reference = subprocess.run(
+            ["git", "rev-parse", "--short", args.compare], cwd=ROOT, capture_output=True, text=True
+        ).stdout.strip() or args.compare
+        for record in load_results(output):
+            if record["commit"].split("-")[0] == reference and record["concurrency"] == args.concurrency:
+                previous[(record["scale"], record["endpoint"])] = record
+    with open(output, "a") as handle:
+        handle.writelines(json.dumps(record) + "\n" for record in records)
+    print_results(records, previous, args.compare)
+    print(f"\n✅ {len(records)} résultats ajoutés à {output} (commit {commit})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Benchmark of login throughput and browse latency with the bcrypt process pool.
+
+Login clients run authenticate_user in a loop while a browse client times a
+product listing, as request threads would under a login burst. Each worker
+count is measured for --seconds; 0 workers verifies in the calling thread.
+
+Usage:
+    python back/benchmarks/bench_password_pool.py [--clients 16] [--seconds 10]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+import models
+from services import password_pool
+from services.auth_logic import authenticate_user
+from services.passwords import pwd_context
+
+EMAIL = "bench@trinity.local"
+PASSWORD = "bench123"
+
+
+def build_database(path, products=2000):
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add(
+        models.User(
+            first_name="Bench",
+            last_name="Login",
+            email=EMAIL,
+            password=pwd_context.hash(PASSWORD),
+            role="client",
+        )
+    )
+    session.add_all(
+        models.Product(name=f"Produit {i}", category="Bench", price=1 + i % 50, available_quantity=10)
+        for i in range(products)
+    )
+    session.commit()
+    session.close()
+    return sessionmaker(bind=engine)
+
+
+def run(Session, workers, clients, seconds):
+    password_pool.password_pool = password_pool.PasswordPool(workers=workers, queue_size=clients)
+    if workers:
+        # Start the worker processes before the clock starts.
+        for _ in range(workers):
+            password_pool.verify_and_update(PASSWORD, pwd_context.hash(PASSWORD))
+
+    stop = threading.Event()
+    logins = []
+    browse_ms = []
+
+    def login_client():
+        session = Session()
+        try:
+            while not stop.is_set():
+                if authenticate_user(session, EMAIL, PASSWORD):
+                    logins.append(1)
+        finally:
+            session.close()
+
+    def browse_client():
+        session = Session()
+        try:
+            while not stop.is_set():
+                started = time.perf_counter()
+                products = session.query(models.Product).order_by(models.Product.id).limit(50).all()
+                [{"id": p.id, "name": p.name, "price": p.price} for p in products]
+                browse_ms.append((time.perf_counter() - started) * 1000)
+                session.expunge_all()
+                time.sleep(0.01)
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=login_client) for _ in range(clients)]
+    threads.append(threading.Thread(target=browse_client))
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if password_pool.password_pool.executor is not None:
+        password_pool.password_pool.executor.shutdown()
+
+    browse_ms.sort()
+    return {
+        "logins_per_s": len(logins) / elapsed,
+        "browse_p50_ms": statistics.median(browse_ms),
+        "browse_p95_ms": browse_ms[int(len(browse_ms) * 0.95)],
+    }
+
+
+def main():
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=max(4, 2 * cores))
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--workers", type=int, nargs="*", help="worker counts to measure (default: 0, 1, 2, 4 ... cores)")
+    args = parser.parse_args()
+
+    workers = args.workers
+    if workers is None:
+        workers = [0] + sorted({min(2 ** i, cores) for i in range(cores.bit_length() + 1)})
+
+    path = os.path.join(tempfile.mkdtemp(), "bench_password_pool.db")
+    Session = build_database(path)
+    print(f"{cores} cœurs, {args.clients} clients de connexion, {args.seconds:g} s par mesure")
+    print(f"{'workers':>8} {'logins/s':>10} {'browse p50':>12} {'browse p95':>12}")
+    for count in workers:
+        result = run(Session, count, args.clients, args.seconds)
+        label = "inline" if count == 0 else str(count)
+        print(
+            f"{label:>8} {result['logins_per_s']:>10.1f} "
+            f"{result['browse_p50_ms']:>9.2f} ms {result['browse_p95_ms']:>9.2f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Benchmark of mixed read/write throughput for each SQLite pragma profile.
+
+Reader threads list products and read an invoice history while writer threads
+run checkout-shaped transactions (stock read, invoice and lines insert, stock
+update). Each profile gets a fresh database, since journal_mode=WAL persists
+in the file; "database is locked" errors are counted rather than retried.
+
+Usage:
+    python back/benchmarks/bench_sqlite_pragmas.py [--readers 8] [--writers 2] [--seconds 10]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import selectinload, sessionmaker
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+import models
+from db import SQLITE_PROFILES, apply_sqlite_pragmas, sqlite_pragmas
+
+USERS = 50
+PRODUCTS = 2000
+
+
+def build_database(path, profile, invoices=5000):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False}, pool_size=64)
+    apply_sqlite_pragmas(engine, sqlite_pragmas(profile))
+    models.Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+    session = Session()
+    session.add_all(
+        models.User(id=i, first_name="Bench", last_name=str(i), email=f"bench{i}@trinity.local", password="x")
+        for i in range(1, USERS + 1)
+    )
+    session.add_all(
+        models.Product(id=i, name=f"Produit {i}", category=f"Rayon {i % 12}", price=1 + i % 50, available_quantity=10**9)
+        for i in range(1, PRODUCTS + 1)
+    )
+    start = datetime(2024, 1, 1)
+    for i in range(invoices):
+        invoice = models.Invoice(user_id=1 + i % USERS, total_price=10.0, created_at=start + timedelta(hours=i))
+        invoice.details = [
+            models.ProductsList(product_id=1 + (i * 7 + j) % PRODUCTS, quantity=1, unit_price_at_sale=5.0)
+            for j in range(3)
+        ]
+        session.add(invoice)
+    session.commit()
+    session.close()
+    return engine, Session
+
+
+def read(session, rng):
+    offset = rng.randrange(0, PRODUCTS - 50)
+    products = session.query(models.Product).order_by(models.Product.id).offset(offset).limit(50).all()
+    [{"id": p.id, "name": p.name, "price": p.price} for p in products]
+    invoices = (
+        session.query(models.Invoice)
+        .options(selectinload(models.Invoice.details))
+        .filter(models.Invoice.user_id == rng.randint(1, USERS))
+        .order_by(models.Invoice.created_at.desc())
+        .limit(20)
+        .all()
+    )
+    [[d.product_id for d in invoice.details] for invoice in invoices]
+
+
+def write(session, rng):
+    lines = []
+    for product_id in rng.sample(range(1, PRODUCTS + 1), 3):
+        product = session.get(models.Product, product_id)
+        lines.append((product, 1))
+    invoice = models.Invoice(
+        user_id=rng.randint(1, USERS),
+        total_price=sum(product.price for product, _ in lines),
+        created_at=datetime.utcnow(),
+    )
+    invoice.details = [
+        models.ProductsList(product_id=product.id, quantity=quantity, unit_price_at_sale=product.price)
+        for product, quantity in lines
+    ]
+    session.add(invoice)
+    for product, quantity in lines:
+        product.available_quantity -= quantity
+    session.commit()
+
+
+def run(profile, readers, writers, seconds):
+    path = os.path.join(tempfile.mkdtemp(), f"bench_sqlite_{profile}.db")
+    engine, Session = build_database(path, profile)
+    stop = threading.Event()
+    lock = threading.Lock()
+    counts = {"reads": 0, "writes": 0, "locked": 0}
+    write_ms = []
+
+    def client(operation, counter, seed):
+        rng = random.Random(seed)
+        session = Session()
+        try:
+            while not stop.is_set():
+                started = time.perf_counter()
+                try:
+                    operation(session, rng)
+                except OperationalError as error:
+                    session.rollback()
+                    if "locked" not in str(error):
+                        raise
+                    with lock:
+                        counts["locked"] += 1
+                    continue
+                finally:
+                    session.expunge_all()
+                with lock:
+                    counts[counter] += 1
+                    if counter == "writes":
+                        write_ms.append((time.perf_counter() - started) * 1000)
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=client, args=(read, "reads", i)) for i in range(readers)]
+    threads += [threading.Thread(target=client, args=(write, "writes", 1000 + i)) for i in range(writers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    engine.dispose()
+
+    write_ms.sort()
+    return {
+        "reads_per_s": counts["reads"] / elapsed,
+        "writes_per_s": counts["writes"] / elapsed,
+        "write_p95_ms": write_ms[int(len(write_ms) * 0.95)] if write_ms else float("nan"),
+        "locked": counts["locked"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--profiles", nargs="*", default=list(SQLITE_PROFILES))
+    args = parser.parse_args()
+
+    print(f"{args.readers} lecteurs, {args.writers} écrivains, {args.seconds:g} s par profil")
+    print(f"{'profil':<10} {'lectures/s':>11} {'écritures/s':>12} {'écriture p95':>13} {'locked':>7}")
+    for profile in args.profiles:
+        result = run(profile, args.readers, args.writers, args.seconds)
+        print(
+            f"{profile:<10} {result['reads_per_s']:>11.1f} {result['writes_per_s']:>12.1f} "
+            f"{result['write_p95_ms']:>10.2f} ms {result['locked']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Startup benchmark: import time of `main`, time until /ready, and import cost per module.
+
+Each run is a fresh interpreter. The script reports the median import and
+ready times, the slowest top-level packages from `python -X importtime`, and
+exits with status 1 when the median import exceeds --budget-ms or a module
+meant to load lazily (numpy, duckdb, requests, passlib) was executed at import.
+
+Usage:
+    python back/benchmarks/bench_startup.py [--runs 5] [--budget-ms 1500] [--top 15]
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+LAZY_MODULES = ("numpy", "duckdb", "requests", "passlib")
+
+# Run in the child interpreter: the import, then the lifespan (schema check)
+# and a first /ready answer, as a worker would before taking traffic.
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    status = client.get("/ready").status_code
+ready = time.perf_counter()
+loaded = [name for name in {lazy!r} if name in sys.modules]
+print(json.dumps({{"import_ms": (imported - started) * 1000, "ready_ms": (ready - started) * 1000, "status": status, "loaded": loaded}}))
+"""
+
+
+def probe():
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(lazy=LAZY_MODULES)], cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def import_costs():
+    """Cumulative import time of `main` per top-level package, in ms."""
+    baseline = set()
+    for line in subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "pass"], capture_output=True, text=True, check=True
+    ).stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            baseline.add(line.rsplit("|", 1)[1].strip())
+
+    costs = defaultdict(float)
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"], cwd=ROOT, capture_output=True, text=True, check=True
+    ).stderr
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line.split("|")
+        module = name.strip()
+        if module in baseline:
+            continue
+        costs[module.split(".")[0]] += int(self_us.split(":")[1]) / 1000
+    return costs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1500)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    # Workers don't migrate at startup: bring the database up to date first.
+    subprocess.run([sys.executable, "-m", "migrations", "upgrade"], cwd=ROOT, capture_output=True, check=True)
+    results = [probe() for _ in range(args.runs)]
+    import_ms = statistics.median(result["import_ms"] for result in results)
+    ready_ms = statistics.median(result["ready_ms"] for result in results)
+    loaded = sorted({name for result in results for name in result["loaded"]})
+    not_ready = [result["status"] for result in results if result["status"] != 200]
+
+    print(f"{args.runs} démarrages : import de main {import_ms:.0f} ms, /ready {ready_ms:.0f} ms (médianes)")
+    print(f"\n{'paquet':<24} {'import (ms)':>12}")
+    for package, cost in sorted(import_costs().items(), key=lambda item: -item[1])[: args.top]:
+        print(f"{package:<24} {cost:>12.1f}")
+
+    failures = []
+    if import_ms > args.budget_ms:
+        failures.append(f"import de main au-delà du budget ({import_ms:.0f} ms > {args.budget_ms:g} ms)")
+    if loaded:
+        failures.append(f"modules chargés au démarrage au lieu d'à la demande : {', '.join(loaded)}")
+    if not_ready:
+        failures.append(f"/ready a répondu {not_ready}")
+    for failure in failures:
+        print(f"❌ {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
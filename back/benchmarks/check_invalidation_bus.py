@@ -0,0 +1,70 @@
+"""Cross-process check of the cache invalidation bus.
+
+A spawned worker fills tagged caches, this process invalidates an entry the
+way a route does after a write, and the worker must miss on its next read
+while untouched tags keep their entries. Also times the per-read check and a
+publish. Exits with status 1 when an invalidation doesn't cross processes.
+
+Usage:
+    python back/benchmarks/check_invalidation_bus.py
+"""
+
+import multiprocessing
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+
+def worker(results, invalidated):
+    from services.auth_logic import principal_cache, token_version_cache
+
+    principal_cache.set("bus@trinity.local", "principal")
+    token_version_cache.set(1, 0)
+    results.put("filled")
+    invalidated.wait()
+    results.put((principal_cache.get("bus@trinity.local"), token_version_cache.get(1)))
+
+
+def main():
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    invalidated = context.Event()
+    process = context.Process(target=worker, args=(results, invalidated))
+    process.start()
+    results.get(timeout=30)
+
+    from services.auth_logic import invalidate_principal
+    from services.invalidation import invalidation_bus
+
+    invalidate_principal("bus@trinity.local")
+    invalidated.set()
+    principal, version = results.get(timeout=30)
+    process.join()
+
+    subscription = invalidation_bus.subscribe("bench")
+    started = time.perf_counter()
+    for _ in range(100_000):
+        subscription.changed()
+    check_ns = (time.perf_counter() - started) * 1e4
+    started = time.perf_counter()
+    for _ in range(1000):
+        invalidation_bus.publish("bench")
+    publish_us = (time.perf_counter() - started) * 1e3
+
+    failures = 0
+    for label, ok in (
+        ("entrée invalidée absente dans l'autre processus", principal is None),
+        ("tag non publié conservé dans l'autre processus", version == 0),
+    ):
+        failures += not ok
+        print(f"{'✅' if ok else '❌'} {label}")
+    print(f"vérification par lecture : {check_ns:.0f} ns, publication : {publish_us:.1f} µs")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
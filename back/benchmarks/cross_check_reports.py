@@ -0,0 +1,75 @@
+"""Cross-check of the DuckDB report backend against the SQLAlchemy path.
+
+Runs every report query through both backends on the same database, for the
+whole history and a few date windows, and exits with status 1 on any
+difference. Also prints the time taken by each backend.
+
+Usage:
+    python back/benchmarks/cross_check_reports.py [--source sqlite|parquet]
+"""
+
+import argparse
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+from db import SessionLocal
+from services.customer_sketches import exact_customers
+from services.duckdb_reports import DuckDBReports
+from services.reports_logic import kpi_summary
+
+
+def windows(today):
+    return [
+        (None, None),
+        (today - timedelta(days=7), None),
+        (today - timedelta(days=30), today - timedelta(days=7)),
+        (None, today - timedelta(days=30)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source", choices=["sqlite", "parquet"], default="sqlite")
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    duckdb_reports = DuckDBReports(source=args.source)
+    failures = 0
+    try:
+        checks = [("kpi_summary", lambda: kpi_summary(session), duckdb_reports.kpi_summary)]
+        for start, end in windows(date.today()):
+            checks.append(
+                (
+                    f"customers {start} -> {end}",
+                    lambda start=start, end=end: exact_customers(session, start, end),
+                    lambda start=start, end=end: duckdb_reports.exact_customers(start, end),
+                )
+            )
+
+        for label, sql_path, duckdb_path in checks:
+            started = time.perf_counter()
+            expected = sql_path()
+            sql_time = time.perf_counter() - started
+            started = time.perf_counter()
+            actual = duckdb_path()
+            duckdb_time = time.perf_counter() - started
+
+            same = expected == actual
+            failures += not same
+            print(f"{'✅' if same else '❌'} {label:<40} sql {sql_time:7.3f} s  duckdb {duckdb_time:7.3f} s")
+            if not same:
+                print(f"   sql:    {expected}\n   duckdb: {actual}")
+    finally:
+        session.close()
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,12 @@
 from sqlalchemy.orm import Session
 from db import SessionLocal, engine
 import models
-from passlib.context import CryptContext
+from migrations import upgrade
+from services.passwords import pwd_context
 import getpass
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 def create_manager():
-    models.Base.metadata.create_all(bind=engine)
+    upgrade(engine)
     
     db = SessionLocal()
     
@@ -1,12 +1,26 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from sqlalchemy.exc import SQLAlchemyError
 from routes import reports, auth, products, invoices, users
-import models
 from db import engine
+from migrations import LATEST_VERSION, check_schema, current_version
+from services.metrics import CONTENT_TYPE, MetricsMiddleware, registry
+from services.profiler import PROFILING_ENABLED, ProfilerMiddleware
+from services.sql_metrics import SQLMetricsMiddleware
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The schema check runs when the server starts, not when main is
+    # imported (scripts, benchmarks), and only reads the version stamp.
+    check_schema(engine)
+    yield
 
-models.Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="Trinity API")
+app = FastAPI(title="Trinity API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -15,6 +29,11 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilerMiddleware)
+app.add_middleware(MetricsMiddleware)
+# Outermost, so the Server-Timing app duration covers the other middleware.
+app.add_middleware(SQLMetricsMiddleware)
 
 app.include_router(auth.router)
 app.include_router(reports.router)
@@ -24,4 +43,20 @@ app.include_router(users.router)
 
 @app.get("/")
 def root():
-    return {"message": "Trinity API is running"}
\ No newline at end of file
+    return {"message": "Trinity API is running"}
+
+@app.get("/ready")
+def ready():
+    """Readiness probe: the database answers and its schema is current."""
+    try:
+        version = current_version(engine)
+    except SQLAlchemyError:
+        raise HTTPException(status_code=503, detail="Base de données injoignable")
+    if version != LATEST_VERSION:
+        raise HTTPException(status_code=503, detail=f"Schéma en version {version}, {LATEST_VERSION} attendue")
+    return {"status": "ready", "schema_version": version}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus metrics of this worker process."""
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
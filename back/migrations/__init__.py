@@ -0,0 +1,58 @@
+"""Versioned schema migrations.
+
+schema_version holds the number of the last step applied to the database
+(see migrations.steps). Startup only reads that stamp; `python -m migrations
+upgrade` applies the missing steps in order and stamps each one.
+"""
+
+import os
+
+from migrations.operations import metadata, read_version, write_version
+from migrations.steps import STEPS
+from services.invalidation import host_lock
+
+LATEST_VERSION = STEPS[-1][0]
+# Off by default: a server started on an outdated database refuses to run
+# and migrations are a deploy step. TRINITY_AUTO_MIGRATE=1 applies the
+# missing steps at startup instead, handy with the local SQLite file.
+AUTO_MIGRATE = os.getenv("TRINITY_AUTO_MIGRATE", "0") == "1"
+
+
+class SchemaVersionError(RuntimeError):
+    pass
+
+
+def current_version(engine) -> int:
+    return read_version(engine)
+
+
+def upgrade(engine, target: int = LATEST_VERSION) -> int:
+    """Applies the steps above the database's version up to `target`; returns the new version."""
+    metadata.create_all(bind=engine)
+    version = read_version(engine)
+    for number, description, step in STEPS:
+        if version < number <= target:
+            print(f"🛠️ Migration {number} : {description}")
+            step(engine)
+            write_version(engine, number)
+            version = number
+    return version
+
+
+def check_schema(engine, auto_upgrade: bool = AUTO_MIGRATE) -> int:
+    """Startup check: the database must be at LATEST_VERSION (upgraded first if `auto_upgrade`)."""
+    version = read_version(engine)
+    if version == LATEST_VERSION:
+        return version
+    if version > LATEST_VERSION:
+        raise SchemaVersionError(
+            f"Base en version {version}, plus récente que ce code (version {LATEST_VERSION})"
+        )
+    if not auto_upgrade:
+        raise SchemaVersionError(
+            f"Base en version {version}, version {LATEST_VERSION} attendue : lancez `python -m migrations upgrade`"
+        )
+    # Workers starting together: the first upgrades, the others then find
+    # the stamp current.
+    with host_lock("migrate"):
+        return upgrade(engine)
@@ -0,0 +1,26 @@
+"""Usage:
+    python -m migrations status
+    python -m migrations upgrade [--target N]
+"""
+
+import argparse
+
+from db import engine
+from migrations import LATEST_VERSION, current_version, upgrade
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m migrations")
+    parser.add_argument("command", choices=["status", "upgrade"])
+    parser.add_argument("--target", type=int, default=LATEST_VERSION)
+    args = parser.parse_args()
+
+    if args.command == "status":
+        print(f"Version de la base : {current_version(engine)} (dernière : {LATEST_VERSION})")
+        return
+    version = upgrade(engine, args.target)
+    print(f"✅ Base en version {version}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Building blocks for migration steps.
+
+Every operation is idempotent, so a step interrupted half-way can simply run
+again: columns and indexes are only created when missing, and backfills
+resume from the last chunk they committed.
+"""
+
+import os
+import time
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, delete, func, insert, inspect, select, update
+from sqlalchemy.orm import Session
+
+INDEX_BATCH_SIZE = int(os.getenv("TRINITY_MIGRATION_INDEX_BATCH", "4"))
+BACKFILL_CHUNK_SIZE = int(os.getenv("TRINITY_MIGRATION_CHUNK_SIZE", "500"))
+# Pause between backfill chunks, so requests get the write lock in between.
+BACKFILL_PAUSE = float(os.getenv("TRINITY_MIGRATION_PAUSE", "0.05"))
+
+metadata = MetaData()
+
+schema_version = Table(
+    "schema_version",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("version", Integer, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+backfill_progress = Table(
+    "schema_backfill_progress",
+    metadata,
+    Column("name", String(100), primary_key=True),
+    Column("position", Integer, nullable=False),
+)
+
+
+def add_missing_columns(engine, table) -> list:
+    """ALTER TABLE ... ADD COLUMN for the model columns `table` lacks; returns their names."""
+    existing = {column["name"] for column in inspect(engine).get_columns(table.name)}
+    added = []
+    with engine.begin() as conn:
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=engine.dialect)}"
+            if column.default is not None and column.default.is_scalar:
+                # Existing rows get the default; NOT NULL needs one on SQLite.
+                ddl += f" DEFAULT {column.default.arg!r}"
+                if not column.nullable:
+                    ddl += " NOT NULL"
+            conn.exec_driver_sql(ddl)
+            added.append(column.name)
+    return added
+
+
+def create_missing_indexes(engine, tables, batch_size: int = INDEX_BATCH_SIZE) -> list:
+    """Creates the declared indexes the database lacks; returns their names.
+
+    SQLite builds them a batch per transaction, each transaction holding the
+    write lock for a few index builds only. PostgreSQL builds each one
+    CONCURRENTLY, which doesn't block writes but can't run in a transaction.
+    """
+    inspector = inspect(engine)
+    existing = {
+        index["name"] for table in tables if inspector.has_table(table.name) for index in inspector.get_indexes(table.name)
+    }
+    missing = [index for table in tables for index in table.indexes if index.name not in existing]
+
+    if engine.dialect.name == "postgresql":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            for index in missing:
+                index.dialect_options["postgresql"]["concurrently"] = True
+                index.create(conn)
+    else:
+        for start in range(0, len(missing), batch_size):
+            with engine.begin() as conn:
+                for index in missing[start : start + batch_size]:
+                    index.create(conn)
+    return [index.name for index in missing]
+
+
+def start_backfill(engine, name: str):
+    with engine.begin() as conn:
+        if conn.execute(select(backfill_progress.c.name).where(backfill_progress.c.name == name)).first() is None:
+            conn.execute(insert(backfill_progress).values(name=name, position=0))
+
+
+def run_backfill(engine, name: str, id_column, chunk, chunk_size: int = BACKFILL_CHUNK_SIZE) -> int:
+    """Runs a backfill started with start_backfill(); returns the chunks processed.
+
+    `chunk(db, low, high)` handles the rows with low < id <= high of
+    `id_column` and commits. The progress row records the last finished
+    chunk, so an interrupted backfill resumes there; `chunk` must tolerate
+    redoing the chunk it was in.
+    """
+    with engine.connect() as conn:
+        position = conn.execute(
+            select(backfill_progress.c.position).where(backfill_progress.c.name == name)
+        ).scalar()
+        last_id = conn.execute(select(func.max(id_column))).scalar() or 0
+    if position is None:
+        return 0
+
+    chunks = 0
+    while position < last_id:
+        high = position + chunk_size
+        with Session(bind=engine) as db:
+            chunk(db, position, high)
+        with engine.begin() as conn:
+            conn.execute(update(backfill_progress).where(backfill_progress.c.name == name).values(position=high))
+        position = high
+        chunks += 1
+        time.sleep(BACKFILL_PAUSE)
+
+    with engine.begin() as conn:
+        conn.execute(delete(backfill_progress).where(backfill_progress.c.name == name))
+    return chunks
+
+
+def read_version(engine) -> int:
+    if not inspect(engine).has_table(schema_version.name):
+        return 0
+    with engine.connect() as conn:
+        return conn.execute(select(schema_version.c.version).where(schema_version.c.id == 1)).scalar() or 0
+
+
+def write_version(engine, version: int):
+    with engine.begin() as conn:
+        stamped = conn.execute(
+            update(schema_version).where(schema_version.c.id == 1).values(version=version, applied_at=datetime.utcnow())
+        )
+        if stamped.rowcount == 0:
+            conn.execute(insert(schema_version).values(id=1, version=version, applied_at=datetime.utcnow()))
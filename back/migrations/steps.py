@@ -0,0 +1,71 @@
+"""Schema history, oldest first. Append new steps with the next number;
+never edit a step a database may already have applied."""
+
+from sqlalchemy import func, select
+
+import models
+from migrations.operations import add_missing_columns, create_missing_indexes, run_backfill, start_backfill
+from services.customer_sketches import rebuild_sketches
+from services.customer_stats import rebuild_customer_stats
+
+
+def create_tables(engine):
+    # A new database gets every table and index here; on an existing one
+    # this only adds the tables it lacks.
+    models.Base.metadata.create_all(bind=engine)
+
+
+def customer_aggregates(engine):
+    # customer_stats gained total_spent after it shipped and
+    # customer_category_spend came later still: refill both from the invoices
+    # when the column was just added or a table is empty but shouldn't be.
+    stats = models.CustomerStats.__table__
+    added = add_missing_columns(engine, stats)
+
+    def count(query):
+        with engine.connect() as conn:
+            return conn.execute(query).scalar()
+
+    has_stats = count(select(func.count()).select_from(stats)) > 0
+    if (
+        added
+        or (not has_stats and count(select(func.count(models.Invoice.id)).where(models.Invoice.user_id.isnot(None))))
+        or (has_stats and count(select(func.count()).select_from(models.CustomerCategorySpend.__table__)) == 0)
+    ):
+        start_backfill(engine, "customer_aggregates")
+    chunks = run_backfill(
+        engine,
+        "customer_aggregates",
+        models.User.id,
+        lambda db, low, high: rebuild_customer_stats(db, (low, high)),
+    )
+    if chunks:
+        print(f"   agrégats clients recalculés en {chunks} lot(s)")
+
+
+def create_indexes(engine):
+    created = create_missing_indexes(engine, models.Base.metadata.sorted_tables)
+    if created:
+        print(f"   index créés : {', '.join(created)}")
+
+
+def customer_sketches(engine):
+    # daily_customer_sketches was only fed by checkouts: fill in the earlier
+    # invoices. Chunks merge into the rows, so live checkouts are kept.
+    start_backfill(engine, "customer_sketches")
+    chunks = run_backfill(
+        engine,
+        "customer_sketches",
+        models.User.id,
+        lambda db, low, high: rebuild_sketches(db, (low, high)),
+    )
+    if chunks:
+        print(f"   sketches clients recalculés en {chunks} lot(s)")
+
+
+STEPS = [
+    (1, "tables du modèle", create_tables),
+    (2, "customer_stats.total_spent et customer_category_spend", customer_aggregates),
+    (3, "index de recherche, de tri et d'historique", create_indexes),
+    (4, "daily_customer_sketches des factures existantes", customer_sketches),
+]
@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Text
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Text, Date, LargeBinary, Index
 from db import Base
+from sql_functions import nocase
 from sqlalchemy.orm import relationship
 from datetime import datetime
 
@@ -19,6 +20,12 @@ class User(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     invoices = relationship("Invoice", back_populates="user")
 
+# Manager listing: newest first (keyset pagination) and case-insensitive prefix search.
+Index("ix_users_created_at_id", User.created_at, User.id)
+Index("ix_users_email_nocase", nocase(User.email))
+Index("ix_users_first_name_nocase", nocase(User.first_name))
+Index("ix_users_last_name_nocase", nocase(User.last_name))
+
 class Product(Base):
     __tablename__ = 'products'
     id = Column(Integer, primary_key=True)
@@ -42,6 +49,8 @@ class Invoice(Base):
     user = relationship("User", back_populates="invoices")
     details = relationship("ProductsList", back_populates="invoice")
 
+Index("ix_invoices_user_id_created_at", Invoice.user_id, Invoice.created_at, Invoice.id)
+
 class ProductsList(Base):
     __tablename__ = 'products_list'
     id = Column(Integer, primary_key=True)
@@ -51,3 +60,42 @@ class ProductsList(Base):
     unit_price_at_sale = Column(Float, nullable=False)
     invoice = relationship("Invoice", back_populates="details")
     product = relationship("Product", back_populates="items")
+
+Index("ix_products_list_invoice_id", ProductsList.invoice_id)
+
+class DailyCustomerSketch(Base):
+    __tablename__ = 'daily_customer_sketches'
+    day = Column(Date, primary_key=True)
+    customers = Column(LargeBinary, nullable=False)
+    repeat_customers = Column(LargeBinary, nullable=False)
+
+class CustomerStats(Base):
+    __tablename__ = 'customer_stats'
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    first_purchase_at = Column(DateTime, nullable=False, index=True)
+    last_purchase_at = Column(DateTime, nullable=False)
+    invoice_count = Column(Integer, nullable=False, default=0)
+    total_spent = Column(Float, nullable=False, default=0)
+
+# Manager listing sorts (user_id breaks ties for keyset pagination).
+Index("ix_customer_stats_total_spent", CustomerStats.total_spent, CustomerStats.user_id)
+Index("ix_customer_stats_last_purchase_at", CustomerStats.last_purchase_at, CustomerStats.user_id)
+Index("ix_customer_stats_invoice_count", CustomerStats.invoice_count, CustomerStats.user_id)
+
+class CustomerCategorySpend(Base):
+    __tablename__ = 'customer_category_spend'
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    category = Column(String(100), primary_key=True)
+    revenue = Column(Float, nullable=False, default=0)
+
+class UserTokenVersion(Base):
+    __tablename__ = 'user_token_versions'
+    user_id = Column(Integer, ForeignKey('users.id'), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+class UserSession(Base):
+    __tablename__ = 'user_sessions'
+    id = Column(String(32), primary_key=True)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
+    token_hash = Column(LargeBinary(32), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
@@ -1,22 +1,40 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import PlainTextResponse
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from passlib.context import CryptContext
-from db import get_db
+from db import get_async_db, get_db, pool_stats
 import models
 import schemas
-from services.auth_logic import authenticate_user, create_access_token, get_current_user
+from services.auth_logic import (
+    Principal,
+    TokenClaims,
+    access_token_claims,
+    authenticate_user,
+    bump_token_version,
+    create_access_token,
+    email_login_limiter,
+    get_current_user,
+    get_token_claims,
+    invalidate_principal,
+    invalidate_token_version,
+    ip_login_limiter,
+    reset_login_throttle,
+    throttle_login,
+)
+from services.invalidation import invalidation_bus
+from services.password_pool import hash_password, password_pool
+from services.profiler import profile_store
+from services.sessions import create_session, revoke_session, revoke_user_sessions, rotate_session
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 @router.post("/register", status_code=status.HTTP_201_CREATED)
 def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
     existing_user = db.query(models.User).filter(models.User.email == user.email).first()
     if existing_user:
         raise HTTPException(status_code=400, detail="Cet email est déjà utilisé")
 
-    hashed_password = pwd_context.hash(user.password)
+    hashed_password = hash_password(user.password)
 
     new_user = models.User(
         email=user.email,
@@ -38,7 +56,8 @@ def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
     return {"message": "Utilisateur créé avec succès", "id": new_user.id}
 
 @router.post("/login")
-def login(db: Session = Depends(get_db), form_data: OAuth2PasswordRequestForm = Depends()):
+def login(request: Request, db: Session = Depends(get_db), form_data: OAuth2PasswordRequestForm = Depends()):
+    throttle_login(form_data.username, request.client.host if request.client else None)
     user = authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
@@ -46,33 +65,108 @@ def login(db: Session = Depends(get_db), form_data: OAuth2PasswordRequestForm =
             detail="Email ou mot de passe incorrect",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    reset_login_throttle(form_data.username)
     
-    access_token = create_access_token(data={"sub": user.email})
+    access_token = create_access_token(data=access_token_claims(db, user))
+    refresh_token = create_session(db, user.id)
+    db.commit()
     
     return {
         "access_token": access_token, 
+        "refresh_token": refresh_token,
+        "token_type": "bearer",
+        "role": user.role
+    }
+
+@router.post("/refresh")
+def refresh(payload: schemas.RefreshRequest, db: Session = Depends(get_db)):
+    rotated = rotate_session(db, payload.refresh_token)
+    if rotated is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Session expirée, veuillez vous reconnecter",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    user, refresh_token = rotated
+
+    return {
+        "access_token": create_access_token(data=access_token_claims(db, user)),
+        "refresh_token": refresh_token,
         "token_type": "bearer",
         "role": user.role
     }
 
+@router.post("/logout")
+def logout(payload: schemas.RefreshRequest, db: Session = Depends(get_db)):
+    revoke_session(db, payload.refresh_token)
+    db.commit()
+    return {"message": "Déconnecté"}
+
+@router.post("/logout-all")
+def logout_all(current_user: TokenClaims = Depends(get_token_claims), db: Session = Depends(get_db)):
+    # Refresh tokens die with their rows, access tokens with the version bump
+    # (immediately in strict mode, at expiry otherwise).
+    revoke_user_sessions(db, current_user.id)
+    bump_token_version(db, current_user.id)
+    db.commit()
+    invalidate_token_version(current_user.id)
+    return {"message": "Toutes les sessions ont été fermées"}
+
 @router.get("/me", response_model=schemas.UserOut)
-async def read_users_me(current_user: models.User = Depends(get_current_user)):
+async def read_users_me(current_user: Principal = Depends(get_current_user)):
     return current_user
 
 @router.put("/me", response_model=schemas.UserOut)
 async def update_user_profile(
     user_update: schemas.UserUpdate, 
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
 ):
     # On récupère l'utilisateur en base
-    db_user = db.query(models.User).filter(models.User.id == current_user.id).first()
+    db_user = await db.get(models.User, current_user.id)
     
     # On met à jour seulement les champs envoyés (non None)
     update_data = user_update.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_user, key, value)
     
-    db.commit()
-    db.refresh(db_user)
-    return db_user
\ No newline at end of file
+    await db.commit()
+    invalidate_principal(db_user.email)
+    return db_user
+
+def _ensure_manager(current_user: TokenClaims):
+    if current_user.role != "manager":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Seuls les managers peuvent consulter ces métriques")
+
+@router.get("/hash-pool")
+def read_hash_pool_stats(current_user: TokenClaims = Depends(get_token_claims)):
+    _ensure_manager(current_user)
+    return password_pool.stats()
+
+@router.get("/invalidation")
+def read_invalidation_stats(current_user: TokenClaims = Depends(get_token_claims)):
+    _ensure_manager(current_user)
+    return invalidation_bus.stats()
+
+@router.get("/db-pools")
+def read_db_pool_stats(current_user: TokenClaims = Depends(get_token_claims)):
+    _ensure_manager(current_user)
+    return pool_stats()
+
+@router.get("/login-throttle")
+def read_login_throttle_stats(current_user: TokenClaims = Depends(get_token_claims)):
+    _ensure_manager(current_user)
+    return {"per_email": email_login_limiter.stats(), "per_ip": ip_login_limiter.stats()}
+
+@router.get("/profiles")
+def list_profiles(current_user: TokenClaims = Depends(get_token_claims)):
+    _ensure_manager(current_user)
+    return profile_store.list()
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+def download_profile(profile_id: str, current_user: TokenClaims = Depends(get_token_claims)):
+    _ensure_manager(current_user)
+    try:
+        return profile_store.read(profile_id)
+    except (KeyError, FileNotFoundError):
+        raise HTTPException(status_code=404, detail="Profil introuvable")
@@ -3,14 +3,22 @@ from dotenv import load_dotenv
 from datetime import datetime
 from typing import List
 
-import requests
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, Field
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 
-from db import get_db
+from db import get_async_read_db, get_db
 import models
-from services.auth_logic import get_current_user
+from services.analytics_store import record_invoice
+from services.auth_logic import Principal, get_current_user
+from services.customer_sketches import record_purchase
+from services.customer_stats import record_checkout
+from services.lazy import lazy_import
+from services.metrics import outbound_request
+
+requests = lazy_import("requests")
 
 router = APIRouter(prefix="/invoices", tags=["Invoices"])
 
@@ -44,7 +52,9 @@ def _paypal_access_token() -> str:
     if not PAYPAL_CLIENT_ID or not PAYPAL_CLIENT_SECRET:
         raise HTTPException(status_code=500, detail="Configuration PayPal manquante")
 
-    resp = requests.post(
+    resp = outbound_request(
+        "paypal",
+        requests.post,
         f"{PAYPAL_BASE_URL}/v1/oauth2/token",
         data={"grant_type": "client_credentials"},
         auth=(PAYPAL_CLIENT_ID, PAYPAL_CLIENT_SECRET),
@@ -61,7 +71,9 @@ def _paypal_create_order(total: float) -> dict:
         "intent": "CAPTURE",
         "purchase_units": [{"amount": {"currency_code": "EUR", "value": f"{total:.2f}"}}],
     }
-    resp = requests.post(
+    resp = outbound_request(
+        "paypal",
+        requests.post,
         f"{PAYPAL_BASE_URL}/v2/checkout/orders",
         headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
         json=payload,
@@ -74,7 +86,9 @@ def _paypal_create_order(total: float) -> dict:
 
 def _paypal_capture_order(order_id: str) -> dict:
     token = _paypal_access_token()
-    resp = requests.post(
+    resp = outbound_request(
+        "paypal",
+        requests.post,
         f"{PAYPAL_BASE_URL}/v2/checkout/orders/{order_id}/capture",
         headers={"Authorization": f"Bearer {token}", "Content-Type": "application/json"},
         timeout=15,
@@ -89,7 +103,7 @@ def _paypal_capture_order(order_id: str) -> dict:
 def create_paypal_order(
     items: List[CheckoutItem],
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     if not items:
         raise HTTPException(status_code=400, detail="Panier vide")
@@ -112,7 +126,7 @@ def create_paypal_order(
 def checkout(
     payload: CheckoutPayload,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
 ):
     if not payload.items:
         raise HTTPException(status_code=400, detail="Panier vide")
@@ -121,10 +135,21 @@ def checkout(
     if capture.get("status") != "COMPLETED":
         raise HTTPException(status_code=400, detail="Paiement PayPal non complété")
 
+    # Lock the basket's products until commit so concurrent checkouts can't
+    # both pass the stock check (FOR UPDATE on PostgreSQL). Locking in id
+    # order keeps two baskets from deadlocking.
+    products = {
+        product.id: product
+        for product in db.query(models.Product)
+        .filter(models.Product.id.in_({line.product_id for line in payload.items}))
+        .order_by(models.Product.id)
+        .with_for_update()
+    }
+
     total = 0.0
     product_lines = []
     for line in payload.items:
-        product = db.query(models.Product).filter(models.Product.id == line.product_id).first()
+        product = products.get(line.product_id)
         if not product:
             raise HTTPException(status_code=404, detail=f"Produit {line.product_id} introuvable")
         if product.available_quantity < line.quantity:
@@ -150,10 +175,26 @@ def checkout(
                 unit_price_at_sale=unit_price,
             )
         )
-        product.available_quantity -= quantity
+        # Decremented in SQL: SQLite reads the stock above before the write
+        # transaction starts, so only this UPDATE sees concurrent checkouts.
+        updated = (
+            db.query(models.Product)
+            .filter(models.Product.id == product.id, models.Product.available_quantity >= quantity)
+            .update(
+                {models.Product.available_quantity: models.Product.available_quantity - quantity},
+                synchronize_session=False,
+            )
+        )
+        if not updated:
+            detail = f"Stock insuffisant pour {product.name}"
+            db.rollback()
+            raise HTTPException(status_code=400, detail=detail)
 
+    stats = record_checkout(db, invoice, product_lines)
+    record_purchase(db, current_user.id, invoice.created_at, stats.invoice_count)
     db.commit()
     db.refresh(invoice)
+    record_invoice(invoice, product_lines)
 
     return {
         "message": "Paiement validé et commande enregistrée",
@@ -167,14 +208,22 @@ def checkout(
 @router.get("/me")
 @router.get("/me/")
 async def get_my_invoices(
-    current_user: models.User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_read_db),
 ):
-    invoices = db.query(models.Invoice).filter(models.Invoice.user_id == current_user.id).order_by(models.Invoice.created_at.desc()).all()
+    # Lines and products are loaded up front: lazy loads can't run on an AsyncSession.
+    invoices = (
+        await db.scalars(
+            select(models.Invoice)
+            .options(selectinload(models.Invoice.details).selectinload(models.ProductsList.product))
+            .where(models.Invoice.user_id == current_user.id)
+            .order_by(models.Invoice.created_at.desc())
+        )
+    ).all()
 
     result = []
     for inv in invoices:
-        details = db.query(models.ProductsList).filter(models.ProductsList.invoice_id == inv.id).all()
+        details = inv.details
         result.append(
             {
                 "id": inv.id,
@@ -1,14 +1,18 @@
 from typing import Optional
 
-import requests
 from fastapi import APIRouter, Depends, HTTPException, Query, status
 from pydantic import BaseModel, Field
 from sqlalchemy import asc, desc
 from sqlalchemy.orm import Session
 
-from db import get_db
+from db import get_db, get_read_db
 import models
-from services.auth_logic import get_current_user
+from services.analytics_store import record_product, record_product_deleted
+from services.auth_logic import TokenClaims, get_token_claims
+from services.lazy import lazy_import
+from services.metrics import outbound_request
+
+requests = lazy_import("requests")
 
 router = APIRouter(prefix="/products", tags=["Products"])
 
@@ -51,7 +55,7 @@ SORTABLE_FIELDS = {
 }
 
 
-def _ensure_manager(user: models.User):
+def _ensure_manager(user: TokenClaims):
     if user.role != "manager":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -61,7 +65,7 @@ def _ensure_manager(user: models.User):
 
 def _fetch_openfoodfacts_payload(barcode: str) -> dict:
     url = f"https://world.openfoodfacts.org/api/v0/product/{barcode}.json"
-    response = requests.get(url, timeout=10)
+    response = outbound_request("openfoodfacts", requests.get, url, timeout=10)
     data = response.json()
 
     if data.get("status") != 1:
@@ -88,6 +92,7 @@ def _fetch_from_openfoodfacts(barcode: str, db: Session) -> models.Product:
     db.add(new_product)
     db.commit()
     db.refresh(new_product)
+    record_product(new_product)
     return new_product
 
 
@@ -95,7 +100,7 @@ def _fetch_from_openfoodfacts(barcode: str, db: Session) -> models.Product:
 def create_product(
     payload: ProductCreatePayload,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: TokenClaims = Depends(get_token_claims),
 ):
     _ensure_manager(current_user)
 
@@ -108,13 +113,14 @@ def create_product(
     db.add(new_product)
     db.commit()
     db.refresh(new_product)
+    record_product(new_product)
     return new_product
 
 
 @router.get("")
 @router.get("/")
 def list_products(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     q: Optional[str] = None,
     category: Optional[str] = None,
     brand: Optional[str] = None,
@@ -161,7 +167,7 @@ def list_products(
 
 @router.get("/advanced-search")
 def advanced_search_products(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     q: Optional[str] = None,
     category: Optional[str] = None,
     brand: Optional[str] = None,
@@ -189,7 +195,7 @@ def advanced_search_products(
 
 
 @router.get("/scan/{barcode}")
-def scan_product(barcode: str, db: Session = Depends(get_db)):
+def scan_product(barcode: str, db: Session = Depends(get_read_db)):
     product = db.query(models.Product).filter(models.Product.off_id == barcode).first()
     if product:
         return product
@@ -207,14 +213,14 @@ def scan_product(barcode: str, db: Session = Depends(get_db)):
 
 
 @router.get("/search/{query}")
-def search_product(query: str, db: Session = Depends(get_db)):
+def search_product(query: str, db: Session = Depends(get_read_db)):
     local_products = db.query(models.Product).filter(models.Product.name.ilike(f"%{query}%")).all()
     if local_products:
         return local_products
 
     url = f"https://world.openfoodfacts.org/cgi/search.pl?search_terms={query}&search_simple=1&action=process&json=1&page_size=5"
     try:
-        response = requests.get(url, timeout=10)
+        response = outbound_request("openfoodfacts", requests.get, url, timeout=10)
         data = response.json()
         return [
             {
@@ -238,7 +244,7 @@ def import_product_from_openfoodfacts(
     barcode: str,
     overwrite: bool = False,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: TokenClaims = Depends(get_token_claims),
 ):
     _ensure_manager(current_user)
 
@@ -247,15 +253,17 @@ def import_product_from_openfoodfacts(
         return {"message": "Produit déjà existant", "product": existing}
 
     if existing and overwrite:
+        existing_id = existing.id
         db.delete(existing)
         db.commit()
+        record_product_deleted(existing_id)
 
     product = _fetch_from_openfoodfacts(barcode, db)
     return {"message": "Produit importé depuis Open Food Facts", "product": product}
 
 
 @router.get("/{product_id}")
-def get_product(product_id: int, db: Session = Depends(get_db)):
+def get_product(product_id: int, db: Session = Depends(get_read_db)):
     product = db.query(models.Product).filter(models.Product.id == product_id).first()
     if not product:
         raise HTTPException(status_code=404, detail="Produit non trouvé")
@@ -267,7 +275,7 @@ def update_product(
     product_id: int,
     payload: ProductUpdatePayload,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: TokenClaims = Depends(get_token_claims),
 ):
     _ensure_manager(current_user)
 
@@ -280,6 +288,7 @@ def update_product(
 
     db.commit()
     db.refresh(product)
+    record_product(product)
     return product
 
 
@@ -287,7 +296,7 @@ def update_product(
 def delete_product(
     product_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: TokenClaims = Depends(get_token_claims),
 ):
     _ensure_manager(current_user)
 
@@ -297,6 +306,7 @@ def delete_product(
 
     db.delete(product)
     db.commit()
+    record_product_deleted(product_id)
     return {"message": "Produit supprimé"}
 
 
@@ -305,7 +315,7 @@ def upsert_product_stock(
     barcode: str,
     payload: ProductStockUpdate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: TokenClaims = Depends(get_token_claims),
 ):
     _ensure_manager(current_user)
 
@@ -1,21 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 
-from db import get_db
-import models
-from services.auth_logic import get_current_user
+from db import get_read_db
+from services.analytics_store import get_store, np
+from services.auth_logic import TokenClaims, get_token_claims
+from services.customer_sketches import estimate_customers, exact_customers
+from services.customer_stats import cohort_retention
+from services.duckdb_reports import DuckDBReports, try_duckdb
+from services.reports_logic import (
+    LOYALTY_MIN_PURCHASES,
+    basket_size_distribution,
+    kpi_summary,
+    revenue_per_category_week,
+)
 
 router = APIRouter(prefix="/reports", tags=["Reports"])
 
-LOYALTY_MIN_PURCHASES = 2
-
 
 @router.get("")
 @router.get("/")
 def read_reports(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+    current_user: TokenClaims = Depends(get_token_claims),
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    customer_count_mode: str = Query(default="exact", pattern="^(exact|approx)$"),
 ):
     if current_user.role != "manager":
         raise HTTPException(
@@ -23,82 +35,89 @@ def read_reports(
             detail="Seuls les managers peuvent accéder aux KPI",
         )
 
-    total_sales = db.query(func.sum(models.Invoice.total_price)).scalar() or 0
-    total_invoices = db.query(func.count(models.Invoice.id)).scalar() or 0
-    average_basket = round(total_sales / total_invoices, 2) if total_invoices > 0 else 0
-
-    total_products = db.query(func.count(models.Product.id)).scalar() or 0
-    out_of_stock = (
-        db.query(func.count(models.Product.id))
-        .filter(models.Product.available_quantity <= 0)
-        .scalar()
-        or 0
-    )
-    stock_rupture_rate = round((out_of_stock / total_products) * 100, 2) if total_products > 0 else 0
-
-    customers_with_purchases = db.query(func.count(func.distinct(models.Invoice.user_id))).scalar() or 0
-    repeat_customers = (
-        db.query(models.Invoice.user_id)
-        .group_by(models.Invoice.user_id)
-        .having(func.count(models.Invoice.id) >= LOYALTY_MIN_PURCHASES)
-        .count()
-    )
+    summary = try_duckdb(DuckDBReports.kpi_summary)
+    backend = "duckdb" if summary is not None else "sql"
+    if summary is None:
+        summary = kpi_summary(db)
+    if customer_count_mode == "approx":
+        customers = estimate_customers(db, start_date, end_date)
+    else:
+        customers = try_duckdb(DuckDBReports.exact_customers, start_date, end_date) or exact_customers(
+            db, start_date, end_date
+        )
+    customers_with_purchases = customers["customers_with_purchases"]
+    repeat_customers = customers["repeat_customers"]
     customer_loyalty_rate = (
         round((repeat_customers / customers_with_purchases) * 100, 2)
         if customers_with_purchases > 0
         else 0
     )
 
-    top_products_rows = (
-        db.query(
-            models.Product.id,
-            models.Product.name,
-            func.sum(models.ProductsList.quantity).label("total_sold"),
+    return {
+        "average_basket": summary["average_basket"],
+        "stock_rupture_rate": summary["stock_rupture_rate"],
+        "customer_loyalty_rate": customer_loyalty_rate,
+        "top_products": summary["top_products"],
+        "revenue_by_category": summary["revenue_by_category"],
+        "meta": {
+            "loyalty_min_purchases": LOYALTY_MIN_PURCHASES,
+            "backend": backend,
+            "total_invoices": summary["total_invoices"],
+            "total_products": summary["total_products"],
+            "customers": {
+                "mode": customer_count_mode,
+                "start_date": start_date,
+                "end_date": end_date,
+                "customers_with_purchases": customers_with_purchases,
+                "repeat_customers": repeat_customers,
+                "relative_error": customers["relative_error"],
+            },
+        },
+    }
+
+
+@router.get("/analytics")
+def read_analytics(
+    db: Session = Depends(get_read_db),
+    current_user: TokenClaims = Depends(get_token_claims),
+):
+    if current_user.role != "manager":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Seuls les managers peuvent accéder aux KPI",
         )
-        .join(models.ProductsList, models.ProductsList.product_id == models.Product.id)
-        .group_by(models.Product.id)
-        .order_by(func.sum(models.ProductsList.quantity).desc())
-        .limit(5)
-        .all()
-    )
-    top_products = [
-        {
-            "product_id": row.id,
-            "name": row.name,
-            "total_sold": int(row.total_sold or 0),
+
+    store = get_store(db)
+    if store is not None:
+        return {
+            "basket_size_distribution": store.basket_size_distribution(),
+            "revenue_per_category_week": store.revenue_per_category_week(),
+            "meta": {"engine": "numpy"},
         }
-        for row in top_products_rows
-    ]
 
-    revenue_by_category_rows = (
-        db.query(
-            func.coalesce(models.Product.category, "Non catégorisé").label("category"),
-            func.sum(models.ProductsList.quantity * models.ProductsList.unit_price_at_sale).label(
-                "revenue"
-            ),
+    return {
+        "basket_size_distribution": basket_size_distribution(db),
+        "revenue_per_category_week": revenue_per_category_week(db),
+        "meta": {"engine": "sql"},
+    }
+
+
+@router.get("/cohorts")
+def read_cohorts(
+    db: Session = Depends(get_read_db),
+    current_user: TokenClaims = Depends(get_token_claims),
+    weeks: int = Query(default=12, ge=1, le=52),
+    cohorts: int = Query(default=12, ge=1, le=52),
+):
+    if current_user.role != "manager":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Seuls les managers peuvent accéder aux KPI",
         )
-        .join(models.ProductsList, models.ProductsList.product_id == models.Product.id)
-        .group_by(func.coalesce(models.Product.category, "Non catégorisé"))
-        .order_by(func.sum(models.ProductsList.quantity * models.ProductsList.unit_price_at_sale).desc())
-        .all()
-    )
-    revenue_by_category = [
-        {
-            "category": row.category,
-            "revenue": round(float(row.revenue or 0), 2),
-        }
-        for row in revenue_by_category_rows
-    ]
+    if np is None:
+        raise HTTPException(status_code=503, detail="Rapport de cohortes indisponible (numpy manquant)")
 
     return {
-        "average_basket": average_basket,
-        "stock_rupture_rate": stock_rupture_rate,
-        "customer_loyalty_rate": customer_loyalty_rate,
-        "top_products": top_products,
-        "revenue_by_category": revenue_by_category,
-        "meta": {
-            "loyalty_min_purchases": LOYALTY_MIN_PURCHASES,
-            "total_invoices": total_invoices,
-            "total_products": total_products,
-        },
+        "cohorts": cohort_retention(db, weeks=weeks, cohorts=cohorts),
+        "meta": {"weeks": weeks},
     }
\ No newline at end of file
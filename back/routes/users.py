@@ -1,18 +1,34 @@
+import base64
+import csv
+import json
+from datetime import datetime
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from passlib.context import CryptContext
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, status
+from sqlalchemy import DateTime, literal
 from sqlalchemy.orm import Session
 
-from db import get_db
+from db import get_db, get_read_db
+from sql_functions import nocase
 import models
-from services.auth_logic import get_current_user
+import schemas
+from services.auth_logic import (
+    TokenClaims,
+    bump_token_version,
+    delete_token_version,
+    get_token_claims,
+    invalidate_principal,
+    invalidate_token_version,
+)
+from services.customer_stats import SEGMENTS, delete_customer_stats, segment_counts, segment_filter
+from services.password_pool import hash_password
+from services.sessions import revoke_user_sessions
+from services.user_import import import_users
 
 router = APIRouter(prefix="/users", tags=["Users"])
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
-def _ensure_manager(current_user: models.User):
+def _ensure_manager(current_user: TokenClaims):
     if current_user.role != "manager":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -20,68 +36,198 @@ def _ensure_manager(current_user: models.User):
         )
 
 
-@router.get("")
-@router.get("/")
+def _encode_cursor(value, row_id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([value, row_id]).encode()).decode()
+
+
+def _decode_cursor(cursor: str, column):
+    try:
+        value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if value is not None and isinstance(column.type, DateTime):
+            value = datetime.fromisoformat(value)
+        return value, int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Curseur invalide")
+
+
+def _page(query, order_column, id_column, cursor: Optional[str], limit: int) -> dict:
+    """One page of `query` in descending (order_column, id_column) order,
+    keyset-paginated; rows must expose both columns by name."""
+    if cursor:
+        # NULL values come last (see the ORDER BY below).
+        value, row_id = _decode_cursor(cursor, order_column)
+        if value is None:
+            query = query.filter(order_column.is_(None), id_column < row_id)
+        else:
+            query = query.filter(
+                (order_column < value)
+                | ((order_column == value) & (id_column < row_id))
+                | order_column.is_(None)
+            )
+
+    rows = query.order_by(order_column.desc().nulls_last(), id_column.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = _encode_cursor(getattr(last, order_column.key), getattr(last, id_column.key))
+    return {"items": rows[:limit], "next_cursor": next_cursor}
+
+
+def _prefix(column, prefix: str):
+    # Range on nocase() so the ix_users_*_nocase indexes apply. The bounds go
+    # through nocase() too: PostgreSQL lowercases them like the column, while
+    # SQLite keeps the prefix as typed since NOCASE only folds ASCII letters.
+    # U+10FFFF sorts after any character that can follow the prefix.
+    column = nocase(column)
+    return (column >= nocase(literal(prefix))) & (column < nocase(literal(prefix + "\U0010ffff")))
+
+
+SORT_COLUMNS = {
+    "created": models.User.created_at,
+    "ltv": models.CustomerStats.total_spent,
+    "recency": models.CustomerStats.last_purchase_at,
+    "orders": models.CustomerStats.invoice_count,
+}
+
+
+@router.get("", response_model=schemas.UserPage)
+@router.get("/", response_model=schemas.UserPage)
 def list_users(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+    current_user: TokenClaims = Depends(get_token_claims),
     q: Optional[str] = Query(default=None),
     role: Optional[str] = Query(default=None),
+    segment: Optional[str] = Query(default=None, pattern="^(" + "|".join(SEGMENTS) + ")$"),
+    sort_by: str = Query(default="created", pattern="^(created|ltv|recency|orders)$"),
+    cursor: Optional[str] = Query(default=None),
+    limit: int = Query(default=50, ge=1, le=200),
 ):
     _ensure_manager(current_user)
 
-    query = db.query(models.User)
-    if q:
-        like = f"%{q}%"
-        query = query.filter(
-            (models.User.first_name.ilike(like))
-            | (models.User.last_name.ilike(like))
-            | (models.User.email.ilike(like))
-        )
+    User = models.User
+    Stats = models.CustomerStats
+    query = db.query(
+        User.id,
+        User.email,
+        User.first_name,
+        User.last_name,
+        User.role,
+        User.created_at,
+        Stats.user_id,
+        Stats.total_spent,
+        Stats.invoice_count,
+        Stats.last_purchase_at,
+    )
+    if sort_by == "created":
+        query = query.outerjoin(Stats, Stats.user_id == User.id)
+        id_column = User.id
+    else:
+        # Metric sorts walk the customer_stats indexes, so they only list
+        # customers who have bought something.
+        query = query.select_from(Stats).join(User, User.id == Stats.user_id)
+        id_column = Stats.user_id
+    if q and q.strip():
+        q = q.strip()
+        query = query.filter(_prefix(User.email, q) | _prefix(User.first_name, q) | _prefix(User.last_name, q))
     if role:
-        query = query.filter(models.User.role == role)
+        query = query.filter(User.role == role)
+    if segment:
+        query = query.filter(segment_filter(segment))
+    return _page(query, SORT_COLUMNS[sort_by], id_column, cursor, limit)
 
-    users = query.order_by(models.User.created_at.desc()).all()
-    return users
+
+@router.get("/segments")
+def read_segments(
+    db: Session = Depends(get_read_db),
+    current_user: TokenClaims = Depends(get_token_claims),
+):
+    _ensure_manager(current_user)
+    return segment_counts(db)
 
 
 @router.get("/{user_id}")
 def get_user_detail(
     user_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_read_db),
+    current_user: TokenClaims = Depends(get_token_claims),
+    cursor: Optional[str] = Query(default=None),
+    limit: int = Query(default=20, ge=1, le=100),
 ):
     _ensure_manager(current_user)
 
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if not user:
+    # Three queries whatever the history size: user with aggregates, one page
+    # of invoices, then the lines of that page.
+    favourite_category = (
+        db.query(models.CustomerCategorySpend.category)
+        .filter(models.CustomerCategorySpend.user_id == models.User.id)
+        .order_by(models.CustomerCategorySpend.revenue.desc(), models.CustomerCategorySpend.category)
+        .limit(1)
+        .scalar_subquery()
+    )
+    row = (
+        db.query(models.User, models.CustomerStats, favourite_category)
+        .outerjoin(models.CustomerStats, models.CustomerStats.user_id == models.User.id)
+        .filter(models.User.id == user_id)
+        .first()
+    )
+    if not row:
         raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
+    user, stats, favourite = row
 
-    invoices = db.query(models.Invoice).filter(models.Invoice.user_id == user_id).order_by(models.Invoice.created_at.desc()).all()
-    history = []
-    for inv in invoices:
-        details = db.query(models.ProductsList).filter(models.ProductsList.invoice_id == inv.id).all()
-        history.append(
+    page = _page(
+        db.query(models.Invoice).filter(models.Invoice.user_id == user_id),
+        models.Invoice.created_at,
+        models.Invoice.id,
+        cursor,
+        limit,
+    )
+    invoices = page["items"]
+    items = {inv.id: [] for inv in invoices}
+    if items:
+        lines = (
+            db.query(
+                models.ProductsList.invoice_id,
+                models.ProductsList.product_id,
+                models.Product.name,
+                models.ProductsList.quantity,
+                models.ProductsList.unit_price_at_sale,
+            )
+            .outerjoin(models.Product, models.Product.id == models.ProductsList.product_id)
+            .filter(models.ProductsList.invoice_id.in_(list(items)))
+            .order_by(models.ProductsList.id)
+        )
+        for invoice_id, product_id, product_name, quantity, unit_price_at_sale in lines:
+            items[invoice_id].append(
+                {
+                    "product_id": product_id,
+                    "product_name": product_name or "Produit supprimé",
+                    "quantity": quantity,
+                    "unit_price_at_sale": unit_price_at_sale,
+                }
+            )
+
+    return {
+        "user": {field: getattr(user, field) for field in schemas.UserOut.model_fields},
+        "aggregates": {
+            "lifetime_spend": round(stats.total_spent, 2) if stats else 0,
+            "invoice_count": stats.invoice_count if stats else 0,
+            "first_purchase_at": stats.first_purchase_at if stats else None,
+            "last_purchase_at": stats.last_purchase_at if stats else None,
+            "favourite_category": favourite,
+        },
+        "purchase_payment_history": [
             {
                 "invoice_id": inv.id,
                 "created_at": inv.created_at,
                 "total_price": inv.total_price,
                 "paypal_id": inv.paypal_id,
-                "items": [
-                    {
-                        "product_id": d.product_id,
-                        "product_name": d.product.name if d.product else "Produit supprimé",
-                        "quantity": d.quantity,
-                        "unit_price_at_sale": d.unit_price_at_sale,
-                    }
-                    for d in details
-                ],
+                "items": items[inv.id],
             }
-        )
-
-    return {
-        "user": user,
-        "purchase_payment_history": history,
+            for inv in invoices
+        ],
+        "next_cursor": page["next_cursor"],
     }
 
 
@@ -90,7 +236,7 @@ def get_user_detail(
 def create_user(
     payload: dict,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: TokenClaims = Depends(get_token_claims),
 ):
     _ensure_manager(current_user)
 
@@ -107,7 +253,7 @@ def create_user(
         first_name=payload.get("first_name", ""),
         last_name=payload.get("last_name", ""),
         email=email,
-        password=pwd_context.hash(password),
+        password=hash_password(password),
         role=payload.get("role", "client"),
         phone_number=payload.get("phone_number"),
         address=payload.get("address"),
@@ -121,12 +267,26 @@ def create_user(
     return new_user
 
 
+@router.post("/import")
+def import_users_csv(
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user: TokenClaims = Depends(get_token_claims),
+):
+    _ensure_manager(current_user)
+    try:
+        return import_users(db, file.file)
+    except (ValueError, UnicodeDecodeError, csv.Error) as exc:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"CSV invalide : {exc}")
+
+
 @router.put("/{user_id}")
 def update_user(
     user_id: int,
     payload: dict,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: TokenClaims = Depends(get_token_claims),
 ):
     _ensure_manager(current_user)
 
@@ -134,15 +294,22 @@ def update_user(
     if not user:
         raise HTTPException(status_code=404, detail="Utilisateur non trouvé")
 
+    previous_role = user.role
     for key in ["first_name", "last_name", "role", "phone_number", "address", "zip_code", "city", "country"]:
         if key in payload:
             setattr(user, key, payload[key])
 
     if "password" in payload and payload["password"]:
-        user.password = pwd_context.hash(payload["password"])
+        user.password = hash_password(payload["password"])
+        revoke_user_sessions(db, user.id)
+
+    if user.role != previous_role or payload.get("password"):
+        bump_token_version(db, user.id)
 
     db.commit()
     db.refresh(user)
+    invalidate_principal(user.email)
+    invalidate_token_version(user.id)
     return user
 
 
@@ -150,7 +317,7 @@ def update_user(
 def delete_user(
     user_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user),
+    current_user: TokenClaims = Depends(get_token_claims),
 ):
     _ensure_manager(current_user)
 
@@ -161,6 +328,11 @@ def delete_user(
     if user.id == current_user.id:
         raise HTTPException(status_code=400, detail="Impossible de supprimer son propre compte")
 
+    delete_token_version(db, user.id)
+    revoke_user_sessions(db, user.id)
+    delete_customer_stats(db, user.id)
     db.delete(user)
     db.commit()
+    invalidate_principal(user.email)
+    invalidate_token_version(user_id)
     return {"message": "Utilisateur supprimé"}
\ No newline at end of file
@@ -28,6 +28,27 @@ class UserOut(BaseModel):
     class Config:
         from_attributes = True
 
+class UserListItem(BaseModel):
+    id: int
+    email: str
+    first_name: str
+    last_name: str
+    role: str
+    created_at: Optional[datetime] = None
+    total_spent: Optional[float] = None
+    invoice_count: Optional[int] = None
+    last_purchase_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class UserPage(BaseModel):
+    items: List[UserListItem]
+    next_cursor: Optional[str] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
 class UserUpdate(BaseModel):
     first_name: Optional[str] = None
     last_name: Optional[str] = None
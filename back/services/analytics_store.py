@@ -0,0 +1,333 @@
+"""In-memory columnar copy of invoices and invoice lines for vectorized KPIs.
+
+Enabled with TRINITY_ANALYTICS_ENGINE=numpy (requires numpy). The store is
+loaded from the database on first use and checkout appends to it afterwards;
+writes made by other worker processes are read back through the invalidation bus.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models import Invoice, Product, ProductsList
+from services.reports_logic import EPOCH, UNCATEGORIZED, week_start
+from services.invalidation import invalidation_bus
+from services.lazy import lazy_import
+from sql_functions import epoch_day
+
+np = lazy_import("numpy")  # optional, reports fall back to SQL
+
+ANALYTICS_ENGINE = os.getenv("TRINITY_ANALYTICS_ENGINE", "sql")
+LOAD_CHUNK_SIZE = 200_000
+CATCH_UP_CHUNK_SIZE = 500
+# Longer than a checkout transaction stays open.
+SETTLE_SECONDS = 10
+
+
+class _Columns:
+    def __init__(self, dtypes: dict):
+        self.size = 0
+        self.arrays = {name: np.empty(1024, dtype=dtype) for name, dtype in dtypes.items()}
+
+    def extend(self, **values):
+        count = len(next(iter(values.values())))
+        capacity = len(next(iter(self.arrays.values())))
+        if self.size + count > capacity:
+            capacity = max(capacity * 2, self.size + count)
+            for name, array in self.arrays.items():
+                grown = np.empty(capacity, dtype=array.dtype)
+                grown[: self.size] = array[: self.size]
+                self.arrays[name] = grown
+        for name, value in values.items():
+            self.arrays[name][self.size : self.size + count] = value
+        self.size += count
+
+    def view(self) -> dict:
+        return {name: array[: self.size] for name, array in self.arrays.items()}
+
+
+def column_chunks(db: Session, query):
+    # Executed through SQLAlchemy so the cursor events fire (per-request SQL
+    # statistics), but fetched from the DBAPI cursor: NumPy converts plain
+    # tuples about 20 times faster than Row objects.
+    statement = query.statement.compile(bind=db.get_bind(), compile_kwargs={"literal_binds": True})
+    result = db.connection().exec_driver_sql(str(statement))
+    try:
+        for chunk in iter(lambda: result.cursor.fetchmany(LOAD_CHUNK_SIZE), []):
+            yield np.array(chunk, dtype=np.float64).T
+    finally:
+        result.close()
+
+
+class ColumnStore:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.loaded = False
+        # Invoice ids are appended in commit order, which isn't id order:
+        # checkouts record after commit from several threads, and PostgreSQL
+        # sequences hand out ids before commit. A bitmap of the ids already in
+        # the store lets catch_up() fetch the missing ones and skip the rest.
+        self.loaded_ids = np.zeros(0, dtype=np.bool_)
+        # Ids up to settled_id are all loaded or will never be committed.
+        self.settled_id = 0
+        self._scans = deque()
+        self.categories = []
+        self.category_codes = {}
+        self.product_category = np.full(0, -1, dtype=np.int32)
+        self.invoices = _Columns(
+            {"invoice_id": np.int64, "user_id": np.int32, "day": np.int32, "total": np.float64}
+        )
+        self.lines = _Columns(
+            {
+                "invoice_id": np.int64,
+                "user_id": np.int32,
+                "product_id": np.int32,
+                "day": np.int32,
+                "quantity": np.int32,
+                "unit_price": np.float64,
+            }
+        )
+
+    def _category_code(self, category: Optional[str]) -> int:
+        category = category or UNCATEGORIZED
+        code = self.category_codes.get(category)
+        if code is None:
+            code = len(self.categories)
+            self.categories.append(category)
+            self.category_codes[category] = code
+        return code
+
+    def _set_product_category(self, product_id: int, category: Optional[str]):
+        if product_id >= len(self.product_category):
+            grown = np.full(max(product_id + 1, len(self.product_category) * 2), -1, dtype=np.int32)
+            grown[: len(self.product_category)] = self.product_category
+            self.product_category = grown
+        self.product_category[product_id] = self._category_code(category)
+
+    def _is_loaded(self, invoice_id: int) -> bool:
+        return invoice_id < len(self.loaded_ids) and bool(self.loaded_ids[invoice_id])
+
+    def _mark_loaded(self, invoice_ids):
+        if not len(invoice_ids):
+            return
+        highest = int(np.max(invoice_ids))
+        if highest >= len(self.loaded_ids):
+            grown = np.zeros(max(highest + 1, len(self.loaded_ids) * 2), dtype=np.bool_)
+            grown[: len(self.loaded_ids)] = self.loaded_ids
+            self.loaded_ids = grown
+        self.loaded_ids[np.asarray(invoice_ids, dtype=np.int64)] = True
+
+    def load(self, db: Session):
+        with self.lock:
+            if self.loaded:
+                return
+            self._load_products(db)
+            self._load_invoices(db)
+            self._scans.append((time.monotonic(), len(self.loaded_ids) - 1 if len(self.loaded_ids) else 0))
+            self.loaded = True
+
+    def catch_up(self, db: Session, products: bool, invoices: bool):
+        """Reads what other worker processes wrote since this store was filled."""
+        with self.lock:
+            if not self.loaded:
+                return
+            if products:
+                self._load_products(db)
+            if invoices:
+                self._load_missing_invoices(db)
+
+    def _load_products(self, db: Session):
+        self.product_category = np.full(0, -1, dtype=np.int32)
+        for product_id, category in db.query(Product.id, Product.category):
+            self._set_product_category(product_id, category)
+
+    def _load_missing_invoices(self, db: Session):
+        ids = np.array(
+            [invoice_id for (invoice_id,) in db.query(Invoice.id).filter(Invoice.id > self.settled_id)],
+            dtype=np.int64,
+        )
+        known = ids < len(self.loaded_ids)
+        missing = ids[~known | ~self.loaded_ids[np.where(known, ids, 0)]]
+        for start in range(0, len(missing), CATCH_UP_CHUNK_SIZE):
+            self._load_invoices(db, [int(invoice_id) for invoice_id in missing[start : start + CATCH_UP_CHUNK_SIZE]])
+
+        # An id can only show up below the highest one seen while its
+        # transaction is still open: settle ids once SETTLE_SECONDS have passed.
+        now = time.monotonic()
+        self._scans.append((now, int(ids.max()) if len(ids) else self.settled_id))
+        while self._scans and self._scans[0][0] <= now - SETTLE_SECONDS:
+            self.settled_id = max(self.settled_id, self._scans.popleft()[1])
+
+    def _load_invoices(self, db: Session, invoice_ids: Optional[list] = None):
+        """Loads every invoice, or those of `invoice_ids`, and their lines."""
+        first_row = self.invoices.size
+        invoice_query = (
+            db.query(
+                Invoice.id,
+                func.coalesce(Invoice.user_id, -1),
+                epoch_day(Invoice.created_at),
+                Invoice.total_price,
+            )
+            .filter(Invoice.created_at.isnot(None))
+            .order_by(Invoice.id)
+        )
+        if invoice_ids is not None:
+            invoice_query = invoice_query.filter(Invoice.id.in_(invoice_ids))
+        for columns in column_chunks(db, invoice_query):
+            self.invoices.extend(
+                invoice_id=columns[0], user_id=columns[1], day=columns[2], total=columns[3]
+            )
+        invoices = self.invoices.view()
+        new_ids = invoices["invoice_id"][first_row:]
+        if not len(new_ids):
+            return
+        self._mark_loaded(new_ids)
+
+        # Lines take user and day from their invoice through a dense id -> row index.
+        lowest, highest = int(new_ids[0]), int(new_ids[-1])
+        invoice_index = np.full(highest - lowest + 1, -1, dtype=np.int64)
+        invoice_index[new_ids - lowest] = np.arange(first_row, self.invoices.size)
+        line_query = db.query(
+            func.coalesce(ProductsList.invoice_id, 0),
+            func.coalesce(ProductsList.product_id, 0),
+            ProductsList.quantity,
+            ProductsList.unit_price_at_sale,
+        ).filter(ProductsList.invoice_id >= lowest, ProductsList.invoice_id <= highest)
+        if invoice_ids is not None:
+            line_query = line_query.filter(ProductsList.invoice_id.in_(invoice_ids))
+        for columns in column_chunks(db, line_query):
+            rows = invoice_index[columns[0].astype(np.int64) - lowest]
+            known = rows >= 0
+            rows = rows[known]
+            self.lines.extend(
+                invoice_id=columns[0][known],
+                user_id=invoices["user_id"][rows],
+                product_id=columns[1][known],
+                day=invoices["day"][rows],
+                quantity=columns[2][known],
+                unit_price=columns[3][known],
+            )
+
+    def append_invoice(self, invoice: Invoice, lines):
+        """Appends a committed invoice; `lines` are (product, quantity, unit_price)."""
+        with self.lock:
+            if not self.loaded or self._is_loaded(invoice.id):
+                return
+            user_id = invoice.user_id if invoice.user_id is not None else -1
+            day = (invoice.created_at.date() - EPOCH).days
+            self.invoices.extend(
+                invoice_id=[invoice.id], user_id=[user_id], day=[day], total=[invoice.total_price]
+            )
+            for product, _, _ in lines:
+                self._set_product_category(product.id, product.category)
+            self.lines.extend(
+                invoice_id=[invoice.id] * len(lines),
+                user_id=[user_id] * len(lines),
+                product_id=[product.id for product, _, _ in lines],
+                day=[day] * len(lines),
+                quantity=[quantity for _, quantity, _ in lines],
+                unit_price=[unit_price for _, _, unit_price in lines],
+            )
+            self._mark_loaded([invoice.id])
+
+    def update_product(self, product: Product):
+        with self.lock:
+            if self.loaded:
+                self._set_product_category(product.id, product.category)
+
+    def remove_product(self, product_id: int):
+        # Lines of deleted products are left out, as the SQL join does.
+        with self.lock:
+            if self.loaded and product_id < len(self.product_category):
+                self.product_category[product_id] = -1
+
+    def basket_size_distribution(self) -> dict:
+        with self.lock:
+            lines = self.lines.view()
+        if not len(lines["invoice_id"]):
+            return {"invoices": 0, "average_items": 0, "distribution": []}
+        sizes = np.bincount(lines["invoice_id"], weights=lines["quantity"]).astype(np.int64)
+        sizes = sizes[sizes > 0]
+        counts = np.bincount(sizes)
+        return {
+            "invoices": int(len(sizes)),
+            "average_items": round(float(sizes.mean()), 2),
+            "distribution": [
+                {"items": int(size), "invoices": int(counts[size])} for size in np.flatnonzero(counts)
+            ],
+        }
+
+    def revenue_per_category_week(self) -> list:
+        with self.lock:
+            lines = self.lines.view()
+            product_category = self.product_category
+            categories = list(self.categories)
+        if not len(lines["invoice_id"]):
+            return []
+        product_ids = lines["product_id"]
+        codes = np.full(len(product_ids), -1, dtype=np.int32)
+        known = product_ids < len(product_category)
+        codes[known] = product_category[product_ids[known]]
+        # Lines of deleted products are left out, as the SQL join does.
+        sold = codes >= 0
+        if not sold.any():
+            return []
+        weeks = (lines["day"][sold] + 3) // 7
+        first_week = int(weeks.min())
+        keys = (weeks - first_week) * len(categories) + codes[sold]
+        revenue = np.bincount(keys, weights=lines["quantity"][sold] * lines["unit_price"][sold])
+        groups = np.flatnonzero(np.bincount(keys))
+        rows = [
+            {
+                "week": week_start(first_week + int(key) // len(categories)),
+                "category": categories[key % len(categories)],
+                "revenue": round(float(revenue[key]), 2),
+            }
+            for key in groups
+        ]
+        return sorted(rows, key=lambda row: (row["week"], row["category"]))
+
+
+_store = None
+_store_lock = threading.Lock()
+# Checkouts and product edits in other worker processes.
+_invoices_changed = invalidation_bus.subscribe("invoices")
+_products_changed = invalidation_bus.subscribe("products")
+
+
+def get_store(db: Session) -> Optional[ColumnStore]:
+    global _store
+    if ANALYTICS_ENGINE != "numpy" or np is None:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ColumnStore()
+    _store.load(db)
+    products, invoices = _products_changed.changed(), _invoices_changed.changed()
+    if products or invoices:
+        _store.catch_up(db, products=products, invoices=invoices)
+    return _store
+
+
+def record_invoice(invoice: Invoice, lines):
+    if _store is not None:
+        _store.append_invoice(invoice, lines)
+    invalidation_bus.publish("invoices")
+
+
+def record_product(product: Product):
+    if _store is not None:
+        _store.update_product(product)
+    invalidation_bus.publish("products")
+
+
+def record_product_deleted(product_id: int):
+    if _store is not None:
+        _store.remove_product(product_id)
+    invalidation_bus.publish("products")
@@ -1,52 +1,204 @@
+import os
+from dataclasses import dataclass
+from typing import Optional
+
 from sqlalchemy.orm import Session
-from passlib.context import CryptContext
-from models import User
+from models import User, UserTokenVersion
 from datetime import datetime, timedelta
 from jose import jwt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from db import get_db
 from jose import JWTError, jwt
+from services.cache import TTLCache
+from services.password_pool import verify_and_update
+from services.rate_limit import SlidingWindowLimiter
 
 SECRET_KEY = "TRINITY_SUPER_SECRET_KEY" 
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+PRINCIPAL_CACHE_TTL = int(os.getenv("TRINITY_PRINCIPAL_CACHE_TTL", "60"))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("TRINITY_PRINCIPAL_CACHE_SIZE", "10000"))
+AUTH_STRICT = os.getenv("TRINITY_AUTH_STRICT", "0") == "1"
+TOKEN_VERSION_CACHE_TTL = int(os.getenv("TRINITY_TOKEN_VERSION_CACHE_TTL", "30"))
+LOGIN_WINDOW = int(os.getenv("TRINITY_LOGIN_WINDOW", "60"))
+LOGIN_LIMIT_PER_EMAIL = int(os.getenv("TRINITY_LOGIN_LIMIT_PER_EMAIL", "5"))
+LOGIN_LIMIT_PER_IP = int(os.getenv("TRINITY_LOGIN_LIMIT_PER_IP", "30"))
+LOGIN_LIMITER_SIZE = int(os.getenv("TRINITY_LOGIN_LIMITER_SIZE", "100000"))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
+principal_cache = TTLCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL, tag="principals")
+token_version_cache = TTLCache(PRINCIPAL_CACHE_SIZE, TOKEN_VERSION_CACHE_TTL, tag="token_versions")
+email_login_limiter = SlidingWindowLimiter(LOGIN_LIMIT_PER_EMAIL, LOGIN_WINDOW, LOGIN_LIMITER_SIZE)
+ip_login_limiter = SlidingWindowLimiter(LOGIN_LIMIT_PER_IP, LOGIN_WINDOW, LOGIN_LIMITER_SIZE)
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Authenticated user as seen by the routes: the users row without the password."""
+
+    id: int
+    email: str
+    first_name: str
+    last_name: str
+    role: str
+    phone_number: Optional[str] = None
+    address: Optional[str] = None
+    zip_code: Optional[str] = None
+    city: Optional[str] = None
+    country: Optional[str] = None
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            email=user.email,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            role=user.role,
+            phone_number=user.phone_number,
+            address=user.address,
+            zip_code=user.zip_code,
+            city=user.city,
+            country=user.country,
+        )
+
+
+@dataclass(frozen=True)
+class TokenClaims:
+    """Identity read from the access token alone, without touching the database."""
+
+    id: int
+    email: str
+    role: str
+    version: int
+
+
+def invalidate_principal(email: str):
+    principal_cache.invalidate(email)
+
+
+def get_token_version(db: Session, user_id: int) -> int:
+    """Current token version of the user, -1 once the user no longer exists."""
+    version = token_version_cache.get(user_id)
+    if version is None:
+        row = (
+            db.query(User.id, UserTokenVersion.version)
+            .outerjoin(UserTokenVersion, UserTokenVersion.user_id == User.id)
+            .filter(User.id == user_id)
+            .first()
+        )
+        version = -1 if row is None else row.version or 0
+        token_version_cache.set(user_id, version)
+    return version
+
+
+def bump_token_version(db: Session, user_id: int):
+    """Revokes the user's outstanding tokens in strict mode; once committed, call
+    invalidate_token_version."""
+    row = db.get(UserTokenVersion, user_id)
+    if row is None:
+        row = UserTokenVersion(user_id=user_id, version=0)
+        db.add(row)
+    row.version += 1
+
+
+def delete_token_version(db: Session, user_id: int):
+    db.query(UserTokenVersion).filter(UserTokenVersion.user_id == user_id).delete()
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+
+def invalidate_token_version(user_id: int):
+    token_version_cache.invalidate(user_id)
+
+
+def access_token_claims(db: Session, user: User) -> dict:
+    return {
+        "sub": user.email,
+        "uid": user.id,
+        "role": user.role,
+        "ver": get_token_version(db, user.id),
+    }
+
+def throttle_login(email: str, client_ip: Optional[str]):
+    """Rejects the attempt before any lookup or bcrypt work once the client IP or
+    the targeted email is over its limit."""
+    retry_after = ip_login_limiter.hit(client_ip or "unknown")
+    if retry_after is None:
+        retry_after = email_login_limiter.hit(email.strip().lower())
+    if retry_after is not None:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Trop de tentatives de connexion, réessayez plus tard",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+def reset_login_throttle(email: str):
+    email_login_limiter.reset(email.strip().lower())
 
 def authenticate_user(db: Session, email: str, password: str):
     user = db.query(User).filter(User.email == email).first()
-    if not user or not verify_password(password, user.password):
+    if not user:
+        return False
+    valid, new_hash = verify_and_update(password, user.password)
+    if not valid:
         return False
+    if new_hash:
+        # Hashing parameters changed since this hash was made.
+        user.password = new_hash
+        db.commit()
     return user
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def _decode_token(token: str, credentials_exception: HTTPException) -> dict:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
     except JWTError:
         raise credentials_exception
+    if payload.get("sub") is None:
+        raise credentials_exception
+    return payload
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> Principal:
+    credentials_exception = _credentials_exception()
+    payload = _decode_token(token, credentials_exception)
+    username: str = payload["sub"]
+    if AUTH_STRICT and "uid" in payload and payload.get("ver") != get_token_version(db, payload["uid"]):
+        raise credentials_exception
+
+    principal = principal_cache.get(username)
+    if principal is not None:
+        return principal
 
     user = db.query(User).filter(User.email == username).first()
     
     if user is None:
         raise credentials_exception
-        
-    return user
+
+    principal = Principal.from_user(user)
+    principal_cache.set(username, principal)
+    return principal
+
+def get_token_claims(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    """Authorizes from the token claims; tokens issued before the claims existed
+    fall back to get_current_user."""
+    credentials_exception = _credentials_exception()
+    payload = _decode_token(token, credentials_exception)
+    if "uid" not in payload or "role" not in payload:
+        return get_current_user(token, db)
+
+    version = payload.get("ver", 0)
+    if AUTH_STRICT and version != get_token_version(db, payload["uid"]):
+        raise credentials_exception
+    return TokenClaims(id=payload["uid"], email=payload["sub"], role=payload["role"], version=version)
 
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
\ No newline at end of file
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
@@ -0,0 +1,63 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from services.invalidation import invalidation_bus
+
+# Every TTLCache, for the metrics endpoint.
+CACHES = []
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after `ttl` seconds.
+
+    With a `tag`, invalidate() also tells the other worker processes, which
+    empty their copy of the cache on their next read.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, tag: Optional[str] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.tag = tag
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._subscription = invalidation_bus.subscribe(tag) if tag else None
+        CACHES.append(self)
+
+    def get(self, key):
+        with self._lock:
+            if self._subscription is not None and self._subscription.changed():
+                self._entries.clear()
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.tag:
+            invalidation_bus.publish(self.tag)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,194 @@
+"""Per-day HyperLogLog sketches of purchasing customers.
+
+Each day stores two sketches: every customer who bought that day, and the
+customers whose purchase that day was at least their LOYALTY_MIN_PURCHASES-th.
+Merging the rows of a window gives distinct and repeat customer estimates
+without scanning `invoices`.
+
+Usage (rebuild from existing invoices, from back/):
+    python -m services.customer_sketches
+"""
+
+import hashlib
+import math
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from models import DailyCustomerSketch, Invoice
+from services.reports_logic import LOYALTY_MIN_PURCHASES
+from sql_functions import insert_missing
+
+HLL_PRECISION = 12
+
+
+class HyperLogLog:
+    def __init__(self, registers: Optional[bytes] = None, precision: int = HLL_PRECISION):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = bytearray(registers) if registers else bytearray(self.size)
+
+    @property
+    def relative_error(self) -> float:
+        return 1.04 / math.sqrt(self.size)
+
+    def add(self, user_id: int):
+        digest = hashlib.blake2b(str(user_id).encode(), digest_size=8).digest()
+        value = int.from_bytes(digest, "big")
+        index = value >> (64 - self.precision)
+        rest = value & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size * self.size / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * self.size and zeros:
+            estimate = self.size * math.log(self.size / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        return bytes(self.registers)
+
+
+def _day_row(db: Session, day: date) -> DailyCustomerSketch:
+    """The day's row, created if needed and locked until commit: concurrent
+    checkouts merge their customer into the sketches one after the other."""
+    empty = bytes(1 << HLL_PRECISION)
+    insert_missing(db, DailyCustomerSketch, day=day, customers=empty, repeat_customers=empty)
+    return (
+        db.query(DailyCustomerSketch)
+        .filter(DailyCustomerSketch.day == day)
+        .with_for_update()
+        .populate_existing()
+        .one()
+    )
+
+
+def record_purchase(db: Session, user_id: int, purchased_at: datetime, purchase_count: int):
+    """Adds a checkout, the customer's `purchase_count`-th, to its day's sketches."""
+    row = _day_row(db, purchased_at.date())
+
+    customers = HyperLogLog(row.customers)
+    customers.add(user_id)
+    row.customers = customers.to_bytes()
+
+    if purchase_count >= LOYALTY_MIN_PURCHASES:
+        repeat = HyperLogLog(row.repeat_customers)
+        repeat.add(user_id)
+        row.repeat_customers = repeat.to_bytes()
+
+
+def rebuild_sketches(db: Session, user_range: Optional[tuple] = None) -> int:
+    """Recomputes the sketches from the invoices, for every customer or those
+    with low < user_id <= high when `user_range` is (low, high); returns the
+    days touched.
+
+    A range is merged into the existing rows rather than replacing them: a
+    merge can be repeated and keeps the checkouts recorded meanwhile, so a
+    backfill can run in chunks while the shop is open.
+    """
+    sketches = {}
+    last_user_id = None
+    rank = 0
+    rows = db.query(Invoice.user_id, Invoice.created_at).filter(
+        Invoice.user_id.isnot(None), Invoice.created_at.isnot(None)
+    )
+    if user_range is not None:
+        rows = rows.filter(Invoice.user_id > user_range[0], Invoice.user_id <= user_range[1])
+    for user_id, created_at in rows.order_by(Invoice.user_id, Invoice.created_at, Invoice.id).yield_per(10000):
+        rank = rank + 1 if user_id == last_user_id else 1
+        last_user_id = user_id
+        customers, repeat = sketches.setdefault(created_at.date(), (HyperLogLog(), HyperLogLog()))
+        customers.add(user_id)
+        if rank >= LOYALTY_MIN_PURCHASES:
+            repeat.add(user_id)
+
+    if user_range is None:
+        db.query(DailyCustomerSketch).delete()
+    for day in sorted(sketches):
+        customers, repeat = sketches[day]
+        row = _day_row(db, day)
+        customers.merge(HyperLogLog(row.customers))
+        repeat.merge(HyperLogLog(row.repeat_customers))
+        row.customers = customers.to_bytes()
+        row.repeat_customers = repeat.to_bytes()
+    db.commit()
+    return len(sketches)
+
+
+def estimate_customers(db: Session, start_date: Optional[date] = None, end_date: Optional[date] = None):
+    query = db.query(DailyCustomerSketch)
+    if start_date:
+        query = query.filter(DailyCustomerSketch.day >= start_date)
+    if end_date:
+        query = query.filter(DailyCustomerSketch.day <= end_date)
+
+    customers = HyperLogLog()
+    repeat = HyperLogLog()
+    for row in query:
+        customers.merge(HyperLogLog(row.customers))
+        repeat.merge(HyperLogLog(row.repeat_customers))
+
+    total = customers.count()
+    return {
+        "customers_with_purchases": total,
+        "repeat_customers": min(repeat.count(), total),
+        "relative_error": round(customers.relative_error, 4),
+    }
+
+
+def exact_customers(db: Session, start_date: Optional[date] = None, end_date: Optional[date] = None):
+    if start_date is None and end_date is None:
+        total = db.query(func.count(func.distinct(Invoice.user_id))).scalar() or 0
+        repeat = (
+            db.query(Invoice.user_id)
+            .filter(Invoice.user_id.isnot(None))
+            .group_by(Invoice.user_id)
+            .having(func.count(Invoice.id) >= LOYALTY_MIN_PURCHASES)
+            .count()
+        )
+        return {"customers_with_purchases": total, "repeat_customers": repeat, "relative_error": 0.0}
+
+    window = db.query(
+        Invoice.user_id.label("user_id"),
+        func.max(Invoice.created_at).label("last_seen"),
+    ).filter(Invoice.user_id.isnot(None))
+    if start_date:
+        window = window.filter(Invoice.created_at >= datetime.combine(start_date, time.min))
+    if end_date:
+        window = window.filter(Invoice.created_at < datetime.combine(end_date + timedelta(days=1), time.min))
+    window = window.group_by(Invoice.user_id).subquery()
+
+    total = db.query(func.count()).select_from(window).scalar() or 0
+    # A window customer is a repeat customer once one of their purchases in the
+    # window is at least their LOYALTY_MIN_PURCHASES-th, as in the sketches.
+    repeat = (
+        db.query(window.c.user_id)
+        .join(Invoice, Invoice.user_id == window.c.user_id)
+        .filter(Invoice.created_at <= window.c.last_seen)
+        .group_by(window.c.user_id)
+        .having(func.count(Invoice.id) >= LOYALTY_MIN_PURCHASES)
+        .count()
+    )
+    return {"customers_with_purchases": total, "repeat_customers": repeat, "relative_error": 0.0}
+
+
+if __name__ == "__main__":
+    from db import SessionLocal, engine
+    from migrations import upgrade
+
+    upgrade(engine)
+    session = SessionLocal()
+    try:
+        days = rebuild_sketches(session)
+        print(f"✅ {days} jours de sketches reconstruits")
+    finally:
+        session.close()
@@ -0,0 +1,244 @@
+"""Per-customer purchase aggregates maintained at checkout, and the cohort report.
+
+Usage (rebuild from existing invoices, from back/):
+    python -m services.customer_stats
+"""
+
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+
+from sqlalchemy import case, func, insert, true
+from sqlalchemy.orm import Session
+
+from models import CustomerCategorySpend, CustomerStats, Invoice, Product, ProductsList
+from services.analytics_store import column_chunks, np
+from services.reports_logic import EPOCH, LOYALTY_MIN_PURCHASES, UNCATEGORIZED, week_start
+from sql_functions import epoch_day, insert_missing
+
+SEGMENT_ACTIVE_DAYS = 90
+SEGMENT_LAPSED_DAYS = 180
+SEGMENTS = ("new", "loyal", "at_risk", "lapsed")
+
+
+def record_checkout(db: Session, invoice: Invoice, lines) -> CustomerStats:
+    """Counts a flushed invoice in its customer's aggregates; `lines` are
+    (product, quantity, unit_price).
+
+    The rows are created with INSERT ... ON CONFLICT DO NOTHING and updated in
+    SQL (`invoice_count = invoice_count + 1`), so concurrent checkouts of one
+    customer add up instead of overwriting each other.
+    """
+    user_id = invoice.user_id
+    if db.get(CustomerStats, user_id) is None:
+        # First purchase, or a customer from before the table was filled.
+        first_purchase_at, last_purchase_at, invoice_count, total_spent = (
+            db.query(
+                func.min(Invoice.created_at),
+                func.max(Invoice.created_at),
+                func.count(Invoice.id),
+                func.coalesce(func.sum(Invoice.total_price), 0),
+            )
+            .filter(Invoice.user_id == user_id, Invoice.id != invoice.id)
+            .one()
+        )
+        created = insert_missing(
+            db,
+            CustomerStats,
+            user_id=user_id,
+            first_purchase_at=first_purchase_at or invoice.created_at,
+            last_purchase_at=last_purchase_at or invoice.created_at,
+            invoice_count=invoice_count,
+            total_spent=total_spent,
+        )
+        if created:
+            db.execute(
+                insert(CustomerCategorySpend).from_select(
+                    ["user_id", "category", "revenue"],
+                    _category_revenue_query(db).filter(Invoice.user_id == user_id, Invoice.id != invoice.id).statement,
+                )
+            )
+
+    created_at = invoice.created_at
+    db.query(CustomerStats).filter(CustomerStats.user_id == user_id).update(
+        {
+            CustomerStats.invoice_count: CustomerStats.invoice_count + 1,
+            CustomerStats.total_spent: CustomerStats.total_spent + invoice.total_price,
+            CustomerStats.first_purchase_at: case(
+                (CustomerStats.first_purchase_at > created_at, created_at), else_=CustomerStats.first_purchase_at
+            ),
+            CustomerStats.last_purchase_at: case(
+                (CustomerStats.last_purchase_at < created_at, created_at), else_=CustomerStats.last_purchase_at
+            ),
+        },
+        synchronize_session=False,
+    )
+
+    spend = defaultdict(float)
+    for product, quantity, unit_price in lines:
+        spend[product.category or UNCATEGORIZED] += quantity * unit_price
+    # Sorted so that two checkouts lock a customer's categories in the same order.
+    for category in sorted(spend):
+        insert_missing(db, CustomerCategorySpend, user_id=user_id, category=category, revenue=0)
+        db.query(CustomerCategorySpend).filter(
+            CustomerCategorySpend.user_id == user_id, CustomerCategorySpend.category == category
+        ).update(
+            {CustomerCategorySpend.revenue: CustomerCategorySpend.revenue + spend[category]},
+            synchronize_session=False,
+        )
+    return db.get(CustomerStats, user_id, populate_existing=True)
+
+
+def _category_revenue_query(db: Session):
+    category = func.coalesce(Product.category, UNCATEGORIZED)
+    return (
+        db.query(
+            Invoice.user_id,
+            category,
+            func.sum(ProductsList.quantity * ProductsList.unit_price_at_sale),
+        )
+        .join(ProductsList, ProductsList.invoice_id == Invoice.id)
+        .join(Product, Product.id == ProductsList.product_id)
+        .filter(Invoice.user_id.isnot(None))
+        .group_by(Invoice.user_id, category)
+    )
+
+
+def rebuild_customer_stats(db: Session, user_range: Optional[tuple] = None) -> int:
+    """Recomputes both tables from the invoices, for every customer or those
+    with low < user_id <= high when `user_range` is (low, high)."""
+
+    def selected(column):
+        return true() if user_range is None else (column > user_range[0]) & (column <= user_range[1])
+
+    db.query(CustomerCategorySpend).filter(selected(CustomerCategorySpend.user_id)).delete(synchronize_session=False)
+    db.query(CustomerStats).filter(selected(CustomerStats.user_id)).delete(synchronize_session=False)
+    db.execute(
+        insert(CustomerStats).from_select(
+            ["user_id", "first_purchase_at", "last_purchase_at", "invoice_count", "total_spent"],
+            db.query(
+                Invoice.user_id,
+                func.min(Invoice.created_at),
+                func.max(Invoice.created_at),
+                func.count(Invoice.id),
+                func.coalesce(func.sum(Invoice.total_price), 0),
+            )
+            .filter(Invoice.user_id.isnot(None), Invoice.created_at.isnot(None), selected(Invoice.user_id))
+            .group_by(Invoice.user_id)
+            .statement,
+        )
+    )
+    db.execute(
+        insert(CustomerCategorySpend).from_select(
+            ["user_id", "category", "revenue"],
+            _category_revenue_query(db).filter(selected(Invoice.user_id)).statement,
+        )
+    )
+    db.commit()
+    return db.query(func.count(CustomerStats.user_id)).filter(selected(CustomerStats.user_id)).scalar()
+
+
+def delete_customer_stats(db: Session, user_id: int):
+    """Drops the user's rows before the user itself, whose invoices are detached."""
+    db.query(CustomerCategorySpend).filter(CustomerCategorySpend.user_id == user_id).delete()
+    db.query(CustomerStats).filter(CustomerStats.user_id == user_id).delete()
+
+
+def segment_filter(segment: str, now: Optional[datetime] = None):
+    """Loyalty segments partition buying customers by recency, then order count:
+    active buyers are new or loyal, older ones at risk, then lapsed."""
+    now = now or datetime.utcnow()
+    active_since = now - timedelta(days=SEGMENT_ACTIVE_DAYS)
+    lapsed_before = now - timedelta(days=SEGMENT_LAPSED_DAYS)
+    last = CustomerStats.last_purchase_at
+    return {
+        "new": (last >= active_since) & (CustomerStats.invoice_count < LOYALTY_MIN_PURCHASES),
+        "loyal": (last >= active_since) & (CustomerStats.invoice_count >= LOYALTY_MIN_PURCHASES),
+        "at_risk": (last < active_since) & (last >= lapsed_before),
+        "lapsed": last < lapsed_before,
+    }[segment]
+
+
+def segment_counts(db: Session, now: Optional[datetime] = None) -> dict:
+    row = db.query(
+        *(
+            func.coalesce(func.sum(case((segment_filter(segment, now), 1), else_=0)), 0).label(segment)
+            for segment in SEGMENTS
+        ),
+        func.coalesce(func.sum(CustomerStats.total_spent), 0).label("total_spent"),
+    ).one()
+    return {
+        "segments": {segment: getattr(row, segment) for segment in SEGMENTS},
+        "active_days": SEGMENT_ACTIVE_DAYS,
+        "lapsed_days": SEGMENT_LAPSED_DAYS,
+        "total_spent": round(row.total_spent, 2),
+    }
+
+
+def _load(db: Session, query):
+    chunks = list(column_chunks(db, query))
+    if not chunks:
+        return np.zeros((2, 0), dtype=np.int64)
+    return np.concatenate(chunks, axis=1).astype(np.int64)
+
+
+def cohort_retention(db: Session, weeks: int = 12, cohorts: int = 12, today: Optional[date] = None):
+    """Share of each weekly cohort buying again N weeks after their first purchase."""
+    today = today or datetime.utcnow().date()
+    current_week = ((today - EPOCH).days + 3) // 7
+    first_cohort = current_week - cohorts + 1
+    since = datetime.combine(week_start(first_cohort), time.min)
+    until = datetime.combine(week_start(current_week + 1), time.min)
+    in_cohorts = (CustomerStats.first_purchase_at >= since) & (CustomerStats.first_purchase_at < until)
+
+    # Only members of the requested cohorts are read, found through the
+    # precomputed first purchase date instead of a MIN() over all invoices.
+    members = db.query(CustomerStats.user_id, epoch_day(CustomerStats.first_purchase_at)).filter(in_cohorts)
+    user_ids, first_days = _load(db, members)
+    purchases = (
+        db.query(Invoice.user_id, epoch_day(Invoice.created_at))
+        .join(CustomerStats, CustomerStats.user_id == Invoice.user_id)
+        .filter(in_cohorts, Invoice.created_at < until)
+    )
+    buyer_ids, purchase_days = _load(db, purchases)
+
+    first_weeks = (first_days + 3) // 7
+    first_week_of = np.full(int(user_ids.max(initial=0)) + 1, -1, dtype=np.int64)
+    first_week_of[user_ids] = first_weeks
+    offsets = (purchase_days + 3) // 7 - first_week_of[buyer_ids]
+    kept = (offsets >= 0) & (offsets < weeks)
+
+    # One (customer, week offset) pair per customer buying at least once that week.
+    pairs = np.unique(buyer_ids[kept] * weeks + offsets[kept])
+    pair_cohorts = first_week_of[pairs // weeks] - first_cohort
+    active = np.bincount(pair_cohorts * weeks + pairs % weeks, minlength=cohorts * weeks)
+    active = active.reshape(cohorts, weeks)
+    sizes = np.bincount(first_weeks - first_cohort, minlength=cohorts)
+
+    report = []
+    for index in range(cohorts):
+        observed = min(weeks, current_week - (first_cohort + index) + 1)
+        size = int(sizes[index])
+        report.append(
+            {
+                "cohort_week": week_start(first_cohort + index),
+                "customers": size,
+                "retention": [
+                    round(float(active[index, week]) / size, 4) if size else 0 for week in range(observed)
+                ],
+            }
+        )
+    return report
+
+
+if __name__ == "__main__":
+    from db import SessionLocal, engine
+    from migrations import upgrade
+
+    upgrade(engine)
+    session = SessionLocal()
+    try:
+        customers = rebuild_customer_stats(session)
+        print(f"✅ Statistiques reconstruites pour {customers} clients")
+    finally:
+        session.close()
@@ -0,0 +1,256 @@
+"""Report queries through an embedded DuckDB engine.
+
+Enabled with TRINITY_REPORTS_BACKEND=duckdb (requires duckdb). DuckDB either
+attaches trinity_store.db read-only (TRINITY_DUCKDB_SOURCE=sqlite) or reads a
+Parquet snapshot of it refreshed every TRINITY_DUCKDB_SNAPSHOT_MAX_AGE seconds
+(TRINITY_DUCKDB_SOURCE=parquet), so long scans stay off the SQLite pool.
+
+DuckDB reads SQLite through its sqlite extension, which is installed at
+deploy time (`python -m services.duckdb_reports`) rather than downloaded by
+a request. When DuckDB can't be used, reports fall back to the SQL path.
+DuckDB only reads that SQLite file, so it stays off when TRINITY_DATABASE_URL
+points at another database. DuckDBReports.from_session copies the tables
+into memory instead, to check the queries without the extension.
+"""
+
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import date, datetime, time as day_time, timedelta
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from db import BASE_DIR, DB_PATH, SQLALCHEMY_DATABASE_URL, Base
+from services.lazy import lazy_import
+from services.reports_logic import LOYALTY_MIN_PURCHASES, UNCATEGORIZED
+
+duckdb = lazy_import("duckdb")  # optional, reports stay on SQLAlchemy
+
+REPORTS_BACKEND = os.getenv("TRINITY_REPORTS_BACKEND", "sql")
+DUCKDB_SOURCE = os.getenv("TRINITY_DUCKDB_SOURCE", "sqlite")
+DUCKDB_SNAPSHOT_DIR = os.getenv("TRINITY_DUCKDB_SNAPSHOT_DIR", os.path.join(BASE_DIR, "analytics_snapshot"))
+DUCKDB_SNAPSHOT_MAX_AGE = int(os.getenv("TRINITY_DUCKDB_SNAPSHOT_MAX_AGE", "300"))
+# After a failed start, the SQL path serves reports for this long before DuckDB is tried again.
+DUCKDB_RETRY_AFTER = int(os.getenv("TRINITY_DUCKDB_RETRY_AFTER", "60"))
+
+logger = logging.getLogger("trinity.reports")
+
+TABLES = ("products", "invoices", "products_list")
+DUCKDB_TYPES = {int: "BIGINT", float: "DOUBLE", str: "VARCHAR", datetime: "TIMESTAMP"}
+
+
+def _reads_store_file(database_url: str) -> bool:
+    url = make_url(database_url)
+    return url.get_backend_name() == "sqlite" and bool(url.database) and os.path.abspath(url.database) == DB_PATH
+
+
+if REPORTS_BACKEND == "duckdb" and not _reads_store_file(SQLALCHEMY_DATABASE_URL):
+    logger.warning("TRINITY_REPORTS_BACKEND=duckdb ignoré : la base n'est pas %s, rapports calculés en SQL", DB_PATH)
+    REPORTS_BACKEND = "sql"
+
+
+class DuckDBReports:
+    def __init__(self, db_path: Optional[str] = DB_PATH, source: str = DUCKDB_SOURCE):
+        """Reports on the SQLite file `db_path`, or on an empty in-memory store
+        when it's None (see from_session)."""
+        if duckdb is None:
+            raise RuntimeError("TRINITY_REPORTS_BACKEND=duckdb nécessite le paquet duckdb")
+        self.source = source
+        self.lock = threading.Lock()
+        self.snapshot_at = 0.0
+        # Never download the extension from a request: LOAD fails at once when it's missing.
+        self.conn = duckdb.connect(config={"autoinstall_known_extensions": False})
+        if db_path is None:
+            self.conn.execute("ATTACH ':memory:' AS store")
+            return
+        self.conn.execute("LOAD sqlite")
+        self.conn.execute(f"ATTACH '{db_path}' AS store (TYPE sqlite, READ_ONLY)")
+        if source == "sqlite":
+            self._create_views()
+
+    @classmethod
+    def from_session(cls, db: Session, source: str = DUCKDB_SOURCE) -> "DuckDBReports":
+        """Reports on an in-memory copy of the tables read through `db`: runs
+        the report queries and the Parquet export without the sqlite extension
+        or the SQLite file, e.g. to check them against the SQL path."""
+        reports = cls(None, source)
+        for name in TABLES:
+            columns = list(Base.metadata.tables[name].columns)
+            definitions = ", ".join(f"{column.name} {DUCKDB_TYPES[column.type.python_type]}" for column in columns)
+            reports.conn.execute(f"CREATE TABLE store.{name} ({definitions})")
+            rows = [tuple(row) for row in db.execute(select(*columns))]
+            if rows:
+                placeholders = ", ".join("?" for _ in columns)
+                reports.conn.executemany(f"INSERT INTO store.{name} VALUES ({placeholders})", rows)
+        if source == "sqlite":
+            reports._create_views()
+        return reports
+
+    def _create_views(self):
+        for table in TABLES:
+            self.conn.execute(f"CREATE VIEW {table} AS SELECT * FROM store.{table}")
+
+    def export_snapshot(self):
+        target = os.path.join(DUCKDB_SNAPSHOT_DIR, str(int(time.time() * 1000)))
+        os.makedirs(target)
+        for table in TABLES:
+            path = os.path.join(target, f"{table}.parquet")
+            self.conn.execute(f"COPY (SELECT * FROM store.{table}) TO '{path}' (FORMAT parquet)")
+            self.conn.execute(f"CREATE OR REPLACE VIEW {table} AS SELECT * FROM read_parquet('{path}')")
+        # The previous snapshot stays: cursors opened before the views were
+        # replaced may still be reading it.
+        for name in sorted(os.listdir(DUCKDB_SNAPSHOT_DIR), key=lambda name: int(name) if name.isdigit() else 0)[:-2]:
+            shutil.rmtree(os.path.join(DUCKDB_SNAPSHOT_DIR, name), ignore_errors=True)
+        self.snapshot_at = time.time()
+
+    def cursor(self):
+        with self.lock:
+            if self.source == "parquet" and time.time() - self.snapshot_at > DUCKDB_SNAPSHOT_MAX_AGE:
+                self.export_snapshot()
+            return self.conn.cursor()
+
+    def kpi_summary(self):
+        cur = self.cursor()
+        total_sales, total_invoices = cur.execute(
+            "SELECT COALESCE(SUM(total_price), 0), COUNT(id) FROM invoices"
+        ).fetchone()
+        average_basket = round(total_sales / total_invoices, 2) if total_invoices > 0 else 0
+
+        total_products, out_of_stock = cur.execute(
+            "SELECT COUNT(id), COUNT(id) FILTER (WHERE available_quantity <= 0) FROM products"
+        ).fetchone()
+        stock_rupture_rate = round((out_of_stock / total_products) * 100, 2) if total_products > 0 else 0
+
+        top_products_rows = cur.execute(
+            """
+            SELECT p.id, p.name, SUM(l.quantity) AS total_sold
+            FROM products p JOIN products_list l ON l.product_id = p.id
+            GROUP BY p.id, p.name
+            ORDER BY total_sold DESC, p.id
+            LIMIT 5
+            """
+        ).fetchall()
+        top_products = [
+            {"product_id": product_id, "name": name, "total_sold": int(total_sold or 0)}
+            for product_id, name, total_sold in top_products_rows
+        ]
+
+        revenue_by_category_rows = cur.execute(
+            """
+            SELECT COALESCE(p.category, ?) AS category, SUM(l.quantity * l.unit_price_at_sale) AS revenue
+            FROM products p JOIN products_list l ON l.product_id = p.id
+            GROUP BY 1
+            ORDER BY revenue DESC, category
+            """,
+            [UNCATEGORIZED],
+        ).fetchall()
+        revenue_by_category = [
+            {"category": category, "revenue": round(float(revenue or 0), 2)}
+            for category, revenue in revenue_by_category_rows
+        ]
+
+        return {
+            "average_basket": average_basket,
+            "stock_rupture_rate": stock_rupture_rate,
+            "top_products": top_products,
+            "revenue_by_category": revenue_by_category,
+            "total_invoices": total_invoices,
+            "total_products": total_products,
+        }
+
+    def exact_customers(self, start_date: Optional[date] = None, end_date: Optional[date] = None):
+        cur = self.cursor()
+        if start_date is None and end_date is None:
+            total, repeat = cur.execute(
+                """
+                SELECT
+                    (SELECT COUNT(DISTINCT user_id) FROM invoices),
+                    (SELECT COUNT(*) FROM (
+                        SELECT user_id FROM invoices WHERE user_id IS NOT NULL
+                        GROUP BY user_id HAVING COUNT(id) >= ?
+                    ))
+                """,
+                [LOYALTY_MIN_PURCHASES],
+            ).fetchone()
+            return {"customers_with_purchases": total, "repeat_customers": repeat, "relative_error": 0.0}
+
+        start = datetime.combine(start_date, day_time.min) if start_date else datetime.min
+        end = datetime.combine(end_date + timedelta(days=1), day_time.min) if end_date else datetime.max
+        total, repeat = cur.execute(
+            """
+            WITH window_customers AS (
+                SELECT user_id, MAX(created_at) AS last_seen
+                FROM invoices
+                WHERE user_id IS NOT NULL AND created_at >= ? AND created_at < ?
+                GROUP BY user_id
+            )
+            SELECT
+                (SELECT COUNT(*) FROM window_customers),
+                (SELECT COUNT(*) FROM (
+                    SELECT w.user_id
+                    FROM window_customers w JOIN invoices i ON i.user_id = w.user_id
+                    WHERE i.created_at <= w.last_seen
+                    GROUP BY w.user_id HAVING COUNT(i.id) >= ?
+                ))
+            """,
+            [start, end, LOYALTY_MIN_PURCHASES],
+        ).fetchone()
+        return {"customers_with_purchases": total, "repeat_customers": repeat, "relative_error": 0.0}
+
+
+_reports = None
+_reports_lock = threading.Lock()
+_failed_at = 0.0
+
+
+def get_duckdb_reports() -> Optional[DuckDBReports]:
+    """The DuckDB backend, or None when it's off or couldn't start."""
+    global _reports, _failed_at
+    if REPORTS_BACKEND != "duckdb":
+        return None
+    if _reports is None:
+        with _reports_lock:
+            if _reports is None:
+                if time.monotonic() - _failed_at < DUCKDB_RETRY_AFTER:
+                    return None
+                try:
+                    _reports = DuckDBReports()
+                except RuntimeError as exc:  # duckdb isn't installed: checked before duckdb.Error
+                    _failed_at = time.monotonic()
+                    logger.warning("DuckDB indisponible, rapports calculés en SQL : %s", exc)
+                    return None
+                except duckdb.Error as exc:
+                    _failed_at = time.monotonic()
+                    logger.warning("DuckDB indisponible, rapports calculés en SQL : %s", exc)
+                    return None
+    return _reports
+
+
+def try_duckdb(query, *args):
+    """`query(reports, *args)` on DuckDB, or None when it's off or fails: the caller then uses SQL."""
+    reports = get_duckdb_reports()
+    if reports is None:
+        return None
+    try:
+        return query(reports, *args)
+    except duckdb.Error as exc:
+        logger.warning("Requête DuckDB en échec, rapports calculés en SQL : %s", exc)
+        return None
+
+
+def install_extension():
+    """Installs and loads DuckDB's sqlite extension; run at deploy time."""
+    conn = duckdb.connect()
+    conn.execute("INSTALL sqlite")
+    conn.execute("LOAD sqlite")
+    conn.close()
+
+
+if __name__ == "__main__":
+    install_extension()
+    print("✅ Extension sqlite de DuckDB installée")
@@ -0,0 +1,121 @@
+"""Cache invalidation across the worker processes of one host.
+
+Each tag maps to a 64-bit generation counter in a small memory-mapped file
+shared by every worker started against the same database. publish(tag)
+increments the counter after a committed write; a cache subscribed to the tag
+compares the counter with the last value it saw on each read (one 8-byte
+read) and drops its entries when it moved. Tags share SLOTS counters, so an
+unrelated tag can occasionally cause a spurious drop, never a missed one.
+
+Without fcntl (Windows) the counters still work within one process only.
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import zlib
+from contextlib import contextmanager
+
+from db import SQLALCHEMY_DATABASE_URL
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process development only
+    fcntl = None
+
+SLOTS = 64
+_COUNTER = struct.Struct("<Q")
+BUS_DIR = os.getenv("TRINITY_INVALIDATION_DIR", tempfile.gettempdir())
+# One bus per database, so two deployments on a host don't share counters.
+BUS_NAME = "trinity-" + hashlib.sha1(SQLALCHEMY_DATABASE_URL.encode()).hexdigest()[:12]
+
+
+@contextmanager
+def interprocess_lock(path: str):
+    """Exclusive lock on `path` between the processes of this host."""
+    with open(path, "a+b") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def host_lock(name: str):
+    """interprocess_lock() shared by the workers serving this database."""
+    return interprocess_lock(os.path.join(BUS_DIR, f"{BUS_NAME}.{name}.lock"))
+
+
+class Subscription:
+    def __init__(self, bus: "InvalidationBus", tag: str):
+        self.bus = bus
+        self.tag = tag
+        self.slot = bus.slot(tag)
+        self.seen = bus.generation(self.slot)
+        self.received = 0
+
+    def changed(self) -> bool:
+        """True once after each publish of the tag by any process, except this one's own."""
+        generation = self.bus.generation(self.slot)
+        if generation == self.seen:
+            return False
+        self.seen = generation
+        self.received += 1
+        return True
+
+
+class InvalidationBus:
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.subscriptions = []
+        self.published = 0
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            with interprocess_lock(path + ".lock"):
+                if os.fstat(fd).st_size < SLOTS * _COUNTER.size:
+                    os.ftruncate(fd, SLOTS * _COUNTER.size)
+            self.map = mmap.mmap(fd, SLOTS * _COUNTER.size)
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def slot(tag: str) -> int:
+        return zlib.crc32(tag.encode()) % SLOTS
+
+    def generation(self, slot: int) -> int:
+        return _COUNTER.unpack_from(self.map, slot * _COUNTER.size)[0]
+
+    def subscribe(self, tag: str) -> Subscription:
+        subscription = Subscription(self, tag)
+        with self.lock:
+            self.subscriptions.append(subscription)
+        return subscription
+
+    def publish(self, tag: str):
+        """Call after the write is committed, once the local caches are updated."""
+        slot = self.slot(tag)
+        with self.lock, interprocess_lock(self.path + ".lock"):
+            previous = self.generation(slot)
+            _COUNTER.pack_into(self.map, slot * _COUNTER.size, previous + 1)
+            self.published += 1
+            # This process already applied its own write: its subscriptions
+            # skip the bump unless another process published since they looked.
+            for subscription in self.subscriptions:
+                if subscription.slot == slot and subscription.seen == previous:
+                    subscription.seen = previous + 1
+
+    def stats(self) -> dict:
+        with self.lock:
+            received = {}
+            for subscription in self.subscriptions:
+                received[subscription.tag] = received.get(subscription.tag, 0) + subscription.received
+            return {"path": self.path, "published": self.published, "received": received}
+
+
+invalidation_bus = InvalidationBus(os.path.join(BUS_DIR, BUS_NAME + ".bus"))
@@ -0,0 +1,45 @@
+import importlib
+import importlib.util
+import sys
+import threading
+
+
+class LazyModule:
+    """Stands in for a module and imports it on the first attribute access.
+
+    The import runs under a lock, so threads touching the module together
+    wait for one complete import instead of seeing it half-executed (which
+    importlib.util.LazyLoader allows on Python 3.11).
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attribute):
+        return getattr(self._load(), attribute)
+
+    def __repr__(self):
+        state = "importé" if self._module is not None else "pas encore importé"
+        return f"<module {self._name!r} ({state})>"
+
+
+def lazy_import(name: str):
+    """Module `name`, imported on its first attribute access; None if it isn't installed.
+
+    For heavy modules only some routes need (numpy, duckdb, requests), so
+    importing the app doesn't pay for them.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    if importlib.util.find_spec(name) is None:
+        return None
+    return LazyModule(name)
@@ -0,0 +1,234 @@
+"""Process metrics in the Prometheus text format, served by GET /metrics.
+
+Request and outbound-call counters are sharded per thread: a thread updates
+its own dict without taking a lock (a few microseconds per request) and a
+scrape sums the shards. Threadpool threads come and go (AnyIO stops idle
+ones), so the shards of finished threads are folded into a base total when a
+shard is created or a scrape runs. Pool, password-pool and cache figures are
+read from those services when scraped.
+
+Each worker process has its own metrics: scrape the workers individually or
+sum them in the queries.
+"""
+
+import bisect
+import threading
+import time
+
+from db import POOLS
+from services.cache import CACHES
+from services.password_pool import password_pool
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _sample(name: str, labels: tuple, value) -> str:
+    if labels:
+        name += "{" + ",".join(f'{key}="{_escape(label)}"' for key, label in labels) + "}"
+    return f"{name} {value!r}" if isinstance(value, float) else f"{name} {value}"
+
+
+def _add(totals: dict, shard: dict):
+    """Adds a shard's counters and histograms to `totals`."""
+    for key, value in shard.copy().items():
+        if isinstance(value, list):
+            total = totals.setdefault(key, [0] * len(value))
+            for index, count in enumerate(list(value)):
+                total[index] += count
+        else:
+            totals[key] = totals.get(key, 0) + value
+
+
+class Registry:
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.families = {}
+        self.collectors = []
+        self._local = threading.local()
+        self._shards = []  # (thread, values)
+        self._base = {}  # what finished threads had counted
+        self._shards_lock = threading.Lock()
+
+    def describe(self, name: str, kind: str, help_text: str):
+        self.families[name] = (kind, help_text)
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.values
+        except AttributeError:
+            values = self._local.values = {}
+            with self._shards_lock:
+                self._fold_finished_threads()
+                self._shards.append((threading.current_thread(), values))
+            return values
+
+    def _fold_finished_threads(self):
+        # A finished thread no longer writes to its shard: it can be merged
+        # into the base total and dropped. Called with _shards_lock held.
+        live = []
+        for thread, values in self._shards:
+            if thread.is_alive():
+                live.append((thread, values))
+            else:
+                _add(self._base, values)
+        self._shards = live
+
+    def inc(self, name: str, labels: tuple = (), amount=1):
+        """Adds to a counter, or to a gauge when `amount` may be negative."""
+        shard = self._shard()
+        key = (name, labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def observe(self, name: str, labels: tuple, value: float):
+        shard = self._shard()
+        key = (name, labels)
+        histogram = shard.get(key)
+        if histogram is None:
+            # One count per bucket, then +Inf, then the sum.
+            histogram = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        histogram[bisect.bisect_left(self.buckets, value)] += 1
+        histogram[-1] += value
+
+    def collector(self, function):
+        """Registers `function() -> [(name, labels, value)]`, called on each scrape."""
+        self.collectors.append(function)
+        return function
+
+    def render(self) -> str:
+        totals = {}
+        with self._shards_lock:
+            self._fold_finished_threads()
+            _add(totals, self._base)
+            shards = [values for _, values in self._shards]
+        for shard in shards:
+            _add(totals, shard)
+        for collect in self.collectors:
+            for name, labels, value in collect():
+                totals[(name, labels)] = value
+
+        samples = {}
+        for (name, labels), value in sorted(totals.items(), key=lambda item: item[0]):
+            lines = samples.setdefault(name, [])
+            if not isinstance(value, list):
+                lines.append(_sample(name, labels, value))
+                continue
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), value):
+                cumulative += count
+                lines.append(_sample(f"{name}_bucket", labels + (("le", bound),), cumulative))
+            lines.append(_sample(f"{name}_count", labels, cumulative))
+            lines.append(_sample(f"{name}_sum", labels, float(value[-1])))
+
+        output = []
+        for name, (kind, help_text) in self.families.items():
+            output.append(f"# HELP {name} {help_text}")
+            output.append(f"# TYPE {name} {kind}")
+            output.extend(samples.get(name, ()))
+        return "\n".join(output) + "\n"
+
+
+registry = Registry()
+registry.describe("trinity_http_requests_total", "counter", "Requêtes HTTP terminées, par route et statut.")
+registry.describe("trinity_http_request_duration_seconds", "histogram", "Durée des requêtes HTTP par route.")
+registry.describe("trinity_http_requests_in_flight", "gauge", "Requêtes HTTP en cours.")
+registry.describe("trinity_outbound_request_duration_seconds", "histogram", "Durée des appels sortants par service.")
+registry.describe("trinity_outbound_errors_total", "counter", "Appels sortants en échec (exception ou statut >= 400).")
+registry.describe("trinity_db_pool_checked_out", "gauge", "Connexions empruntées au pool.")
+registry.describe("trinity_db_pool_size", "gauge", "Taille configurée du pool.")
+registry.describe("trinity_db_pool_overflow", "gauge", "Connexions au-delà de la taille du pool.")
+registry.describe("trinity_db_pool_checkouts_total", "counter", "Emprunts de connexion.")
+registry.describe("trinity_db_pool_checkout_wait_seconds_total", "counter", "Temps passé à attendre une connexion.")
+registry.describe("trinity_password_pool_in_flight", "gauge", "Hachages en cours ou en attente d'un worker.")
+registry.describe("trinity_password_pool_queued", "gauge", "Hachages en attente d'un worker.")
+registry.describe("trinity_password_pool_rejected_total", "counter", "Hachages refusés, file pleine (429, ou 503 pour un import).")
+registry.describe("trinity_cache_hits_total", "counter", "Lectures de cache trouvées.")
+registry.describe("trinity_cache_misses_total", "counter", "Lectures de cache manquées.")
+registry.describe("trinity_cache_hit_ratio", "gauge", "Part des lectures de cache trouvées.")
+
+
+@registry.collector
+def _pool_metrics():
+    for name, counters in POOLS.items():
+        pool = counters["engine"].pool
+        labels = (("pool", name),)
+        if hasattr(pool, "checkedout"):
+            yield "trinity_db_pool_checked_out", labels, pool.checkedout()
+            yield "trinity_db_pool_size", labels, pool.size()
+            # overflow() counts down from -size while the pool isn't full.
+            yield "trinity_db_pool_overflow", labels, max(pool.overflow(), 0)
+        yield "trinity_db_pool_checkouts_total", labels, counters["checkouts"]
+        yield "trinity_db_pool_checkout_wait_seconds_total", labels, counters["checkout_wait_seconds"]
+
+
+@registry.collector
+def _password_pool_metrics():
+    stats = password_pool.stats()
+    yield "trinity_password_pool_in_flight", (), stats["in_flight"]
+    yield "trinity_password_pool_queued", (), stats["queued"]
+    yield "trinity_password_pool_rejected_total", (), stats["rejected"]
+
+
+@registry.collector
+def _cache_metrics():
+    for cache in CACHES:
+        stats = cache.stats()
+        labels = (("cache", cache.tag or "anonymous"),)
+        lookups = stats["hits"] + stats["misses"]
+        yield "trinity_cache_hits_total", labels, stats["hits"]
+        yield "trinity_cache_misses_total", labels, stats["misses"]
+        yield "trinity_cache_hit_ratio", labels, round(stats["hits"] / lookups, 4) if lookups else 0.0
+
+
+def outbound_request(service: str, send, *args, **kwargs):
+    """`send(*args, **kwargs)` (e.g. requests.post), timed and counted under `service`."""
+    labels = (("service", service),)
+    started = time.perf_counter()
+    try:
+        response = send(*args, **kwargs)
+    except Exception:
+        registry.inc("trinity_outbound_errors_total", labels)
+        raise
+    finally:
+        registry.observe("trinity_outbound_request_duration_seconds", labels, time.perf_counter() - started)
+    if response.status_code >= 400:
+        registry.inc("trinity_outbound_errors_total", labels)
+    return response
+
+
+class MetricsMiddleware:
+    """ASGI middleware: request count, latency and in-flight requests per route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        registry.inc("trinity_http_requests_in_flight")
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            registry.inc("trinity_http_requests_in_flight", amount=-1)
+            # The router stores the matched route in the scope; unmatched
+            # paths share one label instead of one series per URL.
+            route = scope.get("route")
+            labels = (("method", scope["method"]), ("route", getattr(route, "path", "unmatched")))
+            registry.observe("trinity_http_request_duration_seconds", labels, elapsed)
+            registry.inc("trinity_http_requests_total", labels + (("status", status_code),))
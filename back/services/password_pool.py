@@ -0,0 +1,264 @@
+"""Password hashing and verification in a dedicated process pool.
+
+A password hash costs about 250 ms of CPU (see services.passwords). Calls
+run in TRINITY_HASH_WORKERS processes (default: one per core, 0 hashes in the
+request thread) instead of the request threadpool, and at most
+TRINITY_HASH_QUEUE_SIZE calls wait for a worker: past that, requests are
+rejected with 429 instead of queueing behind a login burst.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, TimeoutError, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from fastapi import HTTPException, status
+
+HASH_WORKERS = int(os.getenv("TRINITY_HASH_WORKERS", str(os.cpu_count() or 1)))
+HASH_QUEUE_SIZE = int(os.getenv("TRINITY_HASH_QUEUE_SIZE", str(max(HASH_WORKERS, 1) * 4)))
+HASH_TIMEOUT = float(os.getenv("TRINITY_HASH_TIMEOUT", "10"))
+
+
+# Set in each worker: the pool's count of submitted jobs no worker has started.
+_queued = None
+
+
+def _init_worker(queued):
+    global _queued
+    _queued = queued
+
+
+def _start(function, *args):
+    with _queued.get_lock():
+        _queued.value -= 1
+    return function(*args)
+
+
+def _timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+# The hashing context is imported where it runs: in the workers, or in the
+# request thread with 0 workers, not when the server starts.
+def _hash(password: str):
+    from services.passwords import pwd_context
+
+    return _timed(pwd_context.hash, password)
+
+
+def _verify_and_update(password: str, hashed_password: str):
+    from services.passwords import pwd_context
+
+    return _timed(pwd_context.verify_and_update, password, hashed_password)
+
+
+def _hash_many(passwords: list):
+    from services.passwords import pwd_context
+
+    return _timed(lambda: [pwd_context.hash(password) for password in passwords])
+
+
+class PasswordPool:
+    def __init__(self, workers: int = HASH_WORKERS, queue_size: int = HASH_QUEUE_SIZE):
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.slots = threading.BoundedSemaphore(self.capacity)
+        self.lock = threading.Lock()
+        self.executor = None
+        self.queued = None
+        self.in_flight = 0
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+        self.failed = 0
+        self.bulk_chunks = 0
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+
+    def _executor(self):
+        """The executor and its queued-jobs counter, shared with its workers."""
+        with self.lock:
+            if self.executor is None:
+                # Workers only import the hashing modules: spawn keeps them from
+                # inheriting the server's threads and connections.
+                context = multiprocessing.get_context("spawn")
+                self.queued = context.Value("i", 0)
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=context, initializer=_init_worker, initargs=(self.queued,)
+                )
+            return self.executor, self.queued
+
+    def _submit(self, function, *args):
+        """Submits a job, counted as queued until a worker starts it."""
+        executor, queued = self._executor()
+        with queued.get_lock():
+            queued.value += 1
+        try:
+            future = executor.submit(_start, function, *args)
+        except BrokenProcessPool:
+            with queued.get_lock():
+                queued.value -= 1
+            raise
+        return future, queued
+
+    def run(self, function, *args):
+        if not self.slots.acquire(blocking=False):
+            with self.lock:
+                self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Trop de connexions en cours, réessayez dans un instant",
+                headers={"Retry-After": "1"},
+            )
+        with self.lock:
+            self.submitted += 1
+            self.in_flight += 1
+        if self.workers == 0:
+            try:
+                result, run_seconds = function(*args)
+            except Exception:
+                with self.lock:
+                    self.failed += 1
+                raise
+            finally:
+                self._finished()
+            with self.lock:
+                self.completed += 1
+                self.run_seconds += run_seconds
+            return result
+
+        started = time.perf_counter()
+        try:
+            future, queued = self._submit(function, *args)
+        except BrokenProcessPool:
+            self._finished()
+            self._broken()
+            raise
+        # The slot is held until the worker is done, not until this request
+        # gives up waiting: a timed-out hash still occupies a worker.
+        future.add_done_callback(lambda _: self._finished())
+        try:
+            result, run_seconds = future.result(timeout=HASH_TIMEOUT)
+        except TimeoutError:
+            if future.cancel():  # frees the slot now if the job hasn't started
+                with queued.get_lock():
+                    queued.value -= 1
+            with self.lock:
+                self.failed += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Vérification du mot de passe trop lente, réessayez dans un instant",
+                headers={"Retry-After": "1"},
+            )
+        except BrokenProcessPool:
+            self._broken()
+            raise
+        except Exception:
+            with self.lock:
+                self.failed += 1
+            raise
+        with self.lock:
+            self.completed += 1
+            self.run_seconds += run_seconds
+            self.wait_seconds += time.perf_counter() - started - run_seconds
+        return result
+
+    def _finished(self):
+        with self.lock:
+            self.in_flight -= 1
+        self.slots.release()
+
+    def _broken(self):
+        """Counts the failure and replaces the executor after a worker died."""
+        with self.lock:
+            self.failed += 1
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def run_chunks(self, function, chunks: list) -> list:
+        """Runs `function` on every chunk, for bulk work.
+
+        At most one chunk per worker is queued at a time, so requests using
+        run() wait behind a few chunks rather than the whole bulk job. Each
+        queued chunk holds a slot like a run() call: bulk work waits up to
+        HASH_TIMEOUT for one (503 past it) instead of being rejected, and
+        leaves that much less room before run() answers 429.
+        """
+        results = [None] * len(chunks)
+        pending = {}
+        try:
+            for index, chunk in enumerate(chunks):
+                if len(pending) >= self.workers > 0:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        results[pending.pop(future)] = future.result()
+                if not self.slots.acquire(timeout=HASH_TIMEOUT):
+                    with self.lock:
+                        self.rejected += 1
+                    raise HTTPException(
+                        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                        detail="Hachage des mots de passe saturé, réessayez dans un instant",
+                        headers={"Retry-After": "1"},
+                    )
+                with self.lock:
+                    self.in_flight += 1
+                if self.workers == 0:
+                    try:
+                        results[index] = function(chunk)
+                    finally:
+                        self._finished()
+                    continue
+                try:
+                    future, _ = self._submit(function, chunk)
+                except BrokenProcessPool:
+                    self._finished()
+                    raise
+                future.add_done_callback(lambda _: self._finished())
+                pending[future] = index
+            for future in list(pending):
+                results[pending.pop(future)] = future.result()
+        except BrokenProcessPool:
+            self._broken()
+            raise
+        with self.lock:
+            self.bulk_chunks += len(chunks)
+        return [result for result, _ in results]
+
+    def stats(self) -> dict:
+        with self.lock:
+            completed = self.completed or 1
+            return {
+                "workers": self.workers,
+                "capacity": self.capacity,
+                "in_flight": self.in_flight,
+                "queued": self.queued.value if self.queued is not None else 0,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "failed": self.failed,
+                "bulk_chunks": self.bulk_chunks,
+                "average_wait_ms": round(self.wait_seconds / completed * 1000, 2),
+                "average_run_ms": round(self.run_seconds / completed * 1000, 2),
+            }
+
+
+password_pool = PasswordPool()
+
+
+def hash_password(password: str) -> str:
+    return password_pool.run(_hash, password)
+
+
+def hash_passwords(passwords: list, chunk_size: int = 8) -> list:
+    chunks = [passwords[start : start + chunk_size] for start in range(0, len(passwords), chunk_size)]
+    return [hashed for chunk in password_pool.run_chunks(_hash_many, chunks) for hashed in chunk]
+
+
+def verify_and_update(password: str, hashed_password: str):
+    """(valid, new hash): the new hash is set when the stored one uses outdated parameters."""
+    return password_pool.run(_verify_and_update, password, hashed_password)
@@ -0,0 +1,131 @@
+"""Shared password hashing context.
+
+The scheme and its cost come from password_hashing.json (written by the
+calibration command), overridden by TRINITY_PASSWORD_SCHEME (bcrypt|argon2),
+TRINITY_BCRYPT_ROUNDS and TRINITY_ARGON2_TIME_COST / _MEMORY_COST /
+_PARALLELISM. Hashes made with another scheme or other parameters still
+verify and are flagged for rehash, which login does on success.
+
+Calibration (from back/, argon2 requires argon2-cffi):
+    python -m services.passwords calibrate [--scheme bcrypt] [--target-ms 250] [--write]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+
+from passlib.context import CryptContext
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD_CONFIG_PATH = os.getenv("TRINITY_PASSWORD_CONFIG", os.path.join(BASE_DIR, "password_hashing.json"))
+
+DEFAULT_SETTINGS = {
+    "scheme": "bcrypt",
+    "bcrypt_rounds": 12,
+    "argon2_time_cost": 3,
+    "argon2_memory_cost": 65536,
+    "argon2_parallelism": 4,
+}
+SCHEMES = ("bcrypt", "argon2")
+ENV_OVERRIDES = {
+    "scheme": "TRINITY_PASSWORD_SCHEME",
+    "bcrypt_rounds": "TRINITY_BCRYPT_ROUNDS",
+    "argon2_time_cost": "TRINITY_ARGON2_TIME_COST",
+    "argon2_memory_cost": "TRINITY_ARGON2_MEMORY_COST",
+    "argon2_parallelism": "TRINITY_ARGON2_PARALLELISM",
+}
+
+
+def load_settings() -> dict:
+    settings = dict(DEFAULT_SETTINGS)
+    if os.path.exists(PASSWORD_CONFIG_PATH):
+        with open(PASSWORD_CONFIG_PATH, encoding="utf-8") as config:
+            settings.update(json.load(config))
+    for key, variable in ENV_OVERRIDES.items():
+        if os.getenv(variable):
+            value = os.getenv(variable)
+            settings[key] = value if key == "scheme" else int(value)
+    if settings["scheme"] not in SCHEMES:
+        raise ValueError(f"Schéma de hachage inconnu : {settings['scheme']}")
+    return settings
+
+
+def build_context(settings: dict) -> CryptContext:
+    rounds = settings["bcrypt_rounds"]
+    return CryptContext(
+        # The configured scheme hashes, the other one only verifies (deprecated).
+        schemes=[settings["scheme"]] + [scheme for scheme in SCHEMES if scheme != settings["scheme"]],
+        deprecated="auto",
+        # Hashes above or below the configured cost are both rehashed.
+        bcrypt__rounds=rounds,
+        bcrypt__min_rounds=rounds,
+        bcrypt__max_rounds=rounds,
+        argon2__time_cost=settings["argon2_time_cost"],
+        argon2__memory_cost=settings["argon2_memory_cost"],
+        argon2__parallelism=settings["argon2_parallelism"],
+    )
+
+
+settings = load_settings()
+pwd_context = build_context(settings)
+
+
+def _hash_ms(context: CryptContext, samples: int = 3) -> float:
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        context.hash("calibration-password")
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def calibrate(scheme: str, target_ms: float) -> dict:
+    """Most expensive parameters of `scheme` whose hash stays under `target_ms`."""
+    chosen = dict(settings, scheme=scheme)
+    if scheme == "bcrypt":
+        for rounds in range(4, 32):
+            elapsed = _hash_ms(build_context(dict(chosen, bcrypt_rounds=rounds)))
+            print(f"bcrypt rounds={rounds}: {elapsed:.0f} ms")
+            if elapsed > target_ms and rounds > 4:
+                break
+            chosen["bcrypt_rounds"] = rounds
+        return chosen
+
+    # argon2: the memory cost is the main defence, so lower it only when a
+    # single pass is already over the target, then raise the time cost.
+    chosen["argon2_time_cost"] = 1
+    while chosen["argon2_memory_cost"] > 8192:
+        elapsed = _hash_ms(build_context(chosen))
+        print(f"argon2 m={chosen['argon2_memory_cost']} t=1: {elapsed:.0f} ms")
+        if elapsed <= target_ms:
+            break
+        chosen["argon2_memory_cost"] //= 2
+    for time_cost in range(2, 20):
+        elapsed = _hash_ms(build_context(dict(chosen, argon2_time_cost=time_cost)))
+        print(f"argon2 m={chosen['argon2_memory_cost']} t={time_cost}: {elapsed:.0f} ms")
+        if elapsed > target_ms:
+            break
+        chosen["argon2_time_cost"] = time_cost
+    return chosen
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["calibrate"])
+    parser.add_argument("--scheme", choices=SCHEMES, default=settings["scheme"])
+    parser.add_argument("--target-ms", type=float, default=250)
+    parser.add_argument("--write", action="store_true", help=f"save to {PASSWORD_CONFIG_PATH}")
+    args = parser.parse_args()
+
+    chosen = calibrate(args.scheme, args.target_ms)
+    print(json.dumps(chosen, indent=2))
+    if args.write:
+        with open(PASSWORD_CONFIG_PATH, "w", encoding="utf-8") as config:
+            json.dump(chosen, config, indent=2)
+        print(f"✅ Paramètres enregistrés dans {PASSWORD_CONFIG_PATH} (pris en compte au redémarrage)")
+
+
+if __name__ == "__main__":
+    main()
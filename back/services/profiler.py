@@ -0,0 +1,219 @@
+"""Wall-clock sampling profiler for live requests, off unless enabled.
+
+With TRINITY_PROFILING=1, ProfilerMiddleware profiles a request when a
+manager's bearer token comes with an `X-Trinity-Profile: 1` header, or at
+random with probability TRINITY_PROFILE_SAMPLE_RATE. When TRINITY_PROFILING
+is off the middleware isn't installed at all.
+
+While a request is profiled, a thread records the stacks of every thread
+every TRINITY_PROFILE_INTERVAL_MS. Only stacks running this application's
+code are kept: idle threadpool threads and the event loop waiting on I/O are
+left out, and a thread waiting for a lock or a connection in a route is not.
+One request is profiled at a time; samples can still include requests served
+concurrently, so the profile records how many were in flight.
+
+Profiles are written to TRINITY_PROFILE_DIR as collapsed stacks (`.folded`,
+readable by flamegraph.pl and speedscope) next to their metadata (`.json`).
+Only the last TRINITY_PROFILE_KEEP are kept.
+"""
+
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from db import BASE_DIR, SessionLocal
+from services.auth_logic import get_token_claims
+
+PROFILING_ENABLED = os.getenv("TRINITY_PROFILING", "0") == "1"
+PROFILE_SAMPLE_RATE = float(os.getenv("TRINITY_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL = float(os.getenv("TRINITY_PROFILE_INTERVAL_MS", "5")) / 1000
+PROFILE_DIR = os.getenv("TRINITY_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "trinity-profiles"))
+PROFILE_KEEP = int(os.getenv("TRINITY_PROFILE_KEEP", "50"))
+PROFILE_HEADER = b"x-trinity-profile"
+
+_SELF = os.path.abspath(__file__)
+
+
+class Sampler:
+    def __init__(self, interval: float = PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="trinity-profiler", daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                in_app = False
+                while frame is not None:
+                    filename = frame.f_code.co_filename
+                    if filename.startswith(BASE_DIR) and filename != _SELF:
+                        in_app = True
+                    stack.append(f"{os.path.basename(filename)}:{frame.f_code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                if in_app:
+                    self.stacks[";".join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+class ProfileStore:
+    def __init__(self, directory: str = PROFILE_DIR, keep: int = PROFILE_KEEP):
+        self.directory = directory
+        self.keep = keep
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def _path(self, profile_id: str, suffix: str) -> str:
+        # Ids come from the URL of the download endpoint: no path separators.
+        if not profile_id or os.path.basename(profile_id) != profile_id or profile_id.startswith("."):
+            raise KeyError(profile_id)
+        return os.path.join(self.directory, profile_id + suffix)
+
+    def save(self, metadata: dict, stacks: Counter) -> str:
+        with self._lock:
+            self._counter += 1
+            profile_id = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{os.getpid()}-{self._counter}"
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self._path(profile_id, ".folded"), "w") as handle:
+            handle.writelines(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        # The metadata is written last: list() only shows complete profiles.
+        with open(self._path(profile_id, ".json"), "w") as handle:
+            json.dump({"id": profile_id, **metadata}, handle)
+        self._rotate()
+        return profile_id
+
+    def _rotate(self):
+        profiles = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.endswith(".json")),
+            key=lambda entry: entry.stat().st_mtime,
+        )
+        for entry in profiles[: max(len(profiles) - self.keep, 0)]:
+            for suffix in (".json", ".folded"):
+                try:
+                    os.remove(entry.path[: -len(".json")] + suffix)
+                except FileNotFoundError:
+                    pass
+
+    def list(self) -> list:
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                try:
+                    with open(entry.path) as handle:
+                        profiles.append(json.load(handle))
+                except (OSError, ValueError):
+                    continue  # rotated away or being written by another worker
+        return sorted(profiles, key=lambda profile: profile["started_at"], reverse=True)
+
+    def read(self, profile_id: str) -> str:
+        with open(self._path(profile_id, ".folded")) as handle:
+            return handle.read()
+
+
+profile_store = ProfileStore()
+
+
+def _manager_token(token: str) -> bool:
+    db = SessionLocal()
+    try:
+        return get_token_claims(token, db).role == "manager"
+    except HTTPException:
+        return False
+    finally:
+        db.close()
+
+
+class ProfilerMiddleware:
+    """ASGI middleware: profiles the requests selected by the header or the sample rate."""
+
+    def __init__(self, app, sample_rate: float = PROFILE_SAMPLE_RATE, store: ProfileStore = profile_store):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.store = store
+        self.busy = threading.Lock()
+        self.in_flight = 0
+
+    async def _reason(self, scope):
+        headers = dict(scope["headers"])
+        if headers.get(PROFILE_HEADER) == b"1":
+            authorization = headers.get(b"authorization", b"").decode("latin-1")
+            scheme, _, token = authorization.partition(" ")
+            if scheme.lower() == "bearer" and token and await run_in_threadpool(_manager_token, token):
+                return "header"
+        if self.sample_rate and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        self.in_flight += 1
+        try:
+            reason = await self._reason(scope)
+            if reason is None or not self.busy.acquire(blocking=False):
+                await self.app(scope, receive, send)
+                return
+            try:
+                await self._profile(scope, receive, send, reason)
+            finally:
+                self.busy.release()
+        finally:
+            self.in_flight -= 1
+
+    async def _profile(self, scope, receive, send, reason: str):
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_flight = self.in_flight
+        started_at = datetime.utcnow().isoformat()
+        started = time.perf_counter()
+        with Sampler() as sampler:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                in_flight = max(in_flight, self.in_flight)
+        route = scope.get("route")
+        metadata = {
+            "started_at": started_at,
+            "method": scope["method"],
+            "path": scope["path"],
+            "route": getattr(route, "path", None),
+            "status": status_code,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+            "reason": reason,
+            "interval_ms": sampler.interval * 1000,
+            "samples": sampler.samples,
+            "in_flight": in_flight,
+        }
+        await run_in_threadpool(self.store.save, metadata, sampler.stacks)
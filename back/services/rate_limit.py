@@ -0,0 +1,72 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class SlidingWindowLimiter:
+    """Thread-safe per-key limit of `limit` hits per `window` seconds.
+
+    Uses the sliding window counter approximation: each key keeps the counts
+    of the current and previous fixed windows, the previous one weighted by
+    its overlap with the sliding window. Keys are evicted in LRU order past
+    `maxsize`, so memory stays bounded whatever the number of clients.
+    """
+
+    def __init__(self, limit: int, window: float, maxsize: int):
+        self.limit = limit
+        self.window = window
+        self.maxsize = maxsize
+        self.allowed = 0
+        self.rejected = 0
+        self.evicted = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key) -> Optional[int]:
+        """Counts a hit for `key`; returns None if allowed, else seconds to wait."""
+        now = time.monotonic()
+        current_window = int(now // self.window)
+        elapsed = now - current_window * self.window
+        with self._lock:
+            window, current, previous = self._entries.get(key, (current_window, 0, 0))
+            if window != current_window:
+                previous = current if window == current_window - 1 else 0
+                current = 0
+            previous_weight = 1 - elapsed / self.window
+
+            if previous * previous_weight + current >= self.limit:
+                self.rejected += 1
+                self._entries[key] = (current_window, current, previous)
+                self._entries.move_to_end(key)
+                if previous and current < self.limit:
+                    # Time until the previous window's share drops below the limit.
+                    wait = self.window * (1 - (self.limit - current) / previous) - elapsed
+                else:
+                    wait = self.window - elapsed
+                return max(1, math.ceil(wait))
+
+            self.allowed += 1
+            self._entries[key] = (current_window, current + 1, previous)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+            return None
+
+    def reset(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "window_seconds": self.window,
+                "max_keys": self.maxsize,
+                "keys": len(self._entries),
+                "allowed": self.allowed,
+                "rejected": self.rejected,
+                "evicted": self.evicted,
+            }
@@ -1,6 +1,19 @@
+from datetime import date, timedelta
+
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from models import Invoice, Product, ProductsList
+from sql_functions import day, epoch_day
+
+LOYALTY_MIN_PURCHASES = 2
+UNCATEGORIZED = "Non catégorisé"
+EPOCH = date(1970, 1, 1)
+
+
+def week_start(week: int) -> date:
+    # 1970-01-01 is a Thursday: shifting days by 3 makes week indexes start on Monday.
+    return EPOCH + timedelta(days=week * 7 - 3)
+
 
 def calculate_kpi_reports(db: Session):
     avg_basket = db.query(func.avg(Invoice.total_price)).scalar() or 0
@@ -20,9 +33,9 @@ def calculate_kpi_reports(db: Session):
     stock_rupture_rate = (out_of_stock / total_refs * 100) if total_refs > 0 else 0
 
     ca_per_day = (
-        db.query(func.date(Invoice.created_at), func.sum(Invoice.total_price))
-        .group_by(func.date(Invoice.created_at))
-        .order_by(func.date(Invoice.created_at).desc())
+        db.query(day(Invoice.created_at), func.sum(Invoice.total_price))
+        .group_by(day(Invoice.created_at))
+        .order_by(day(Invoice.created_at).desc())
         .limit(7)
         .all()
     )
@@ -43,4 +56,102 @@ def calculate_kpi_reports(db: Session):
         "stock_rupture_rate": round(stock_rupture_rate, 2),
         "revenue_history": ca_list,
         "customer_loyalty_rate": round(loyalty_rate, 2)
-    }
\ No newline at end of file
+    }
+
+
+def basket_size_distribution(db: Session):
+    sizes = (
+        db.query(func.sum(ProductsList.quantity).label("item_count"))
+        .group_by(ProductsList.invoice_id)
+        .subquery()
+    )
+    rows = db.query(sizes.c.item_count, func.count()).group_by(sizes.c.item_count).order_by(sizes.c.item_count).all()
+    invoices = sum(count for _, count in rows)
+    items = sum(size * count for size, count in rows)
+    return {
+        "invoices": invoices,
+        "average_items": round(items / invoices, 2) if invoices else 0,
+        "distribution": [{"items": int(size), "invoices": count} for size, count in rows],
+    }
+
+
+def revenue_per_category_week(db: Session):
+    week = ((epoch_day(Invoice.created_at) + 3) // 7).label("week")
+    category = func.coalesce(Product.category, UNCATEGORIZED).label("category")
+    rows = (
+        db.query(week, category, func.sum(ProductsList.quantity * ProductsList.unit_price_at_sale))
+        .select_from(ProductsList)
+        .join(Invoice, Invoice.id == ProductsList.invoice_id)
+        .join(Product, Product.id == ProductsList.product_id)
+        .group_by(week, category)
+        .order_by(week, category)
+        .all()
+    )
+    return [
+        {"week": week_start(int(w)), "category": c, "revenue": round(float(r or 0), 2)}
+        for w, c, r in rows
+    ]
+
+
+def kpi_summary(db: Session):
+    total_sales = db.query(func.sum(Invoice.total_price)).scalar() or 0
+    total_invoices = db.query(func.count(Invoice.id)).scalar() or 0
+    average_basket = round(total_sales / total_invoices, 2) if total_invoices > 0 else 0
+
+    total_products = db.query(func.count(Product.id)).scalar() or 0
+    out_of_stock = (
+        db.query(func.count(Product.id))
+        .filter(Product.available_quantity <= 0)
+        .scalar()
+        or 0
+    )
+    stock_rupture_rate = round((out_of_stock / total_products) * 100, 2) if total_products > 0 else 0
+
+    top_products_rows = (
+        db.query(
+            Product.id,
+            Product.name,
+            func.sum(ProductsList.quantity).label("total_sold"),
+        )
+        .join(ProductsList, ProductsList.product_id == Product.id)
+        .group_by(Product.id)
+        .order_by(func.sum(ProductsList.quantity).desc(), Product.id)
+        .limit(5)
+        .all()
+    )
+    top_products = [
+        {
+            "product_id": row.id,
+            "name": row.name,
+            "total_sold": int(row.total_sold or 0),
+        }
+        for row in top_products_rows
+    ]
+
+    # One expression object per clause: PostgreSQL only matches the SELECT
+    # and GROUP BY expressions when they share the same bound parameter.
+    category = func.coalesce(Product.category, UNCATEGORIZED)
+    revenue = func.sum(ProductsList.quantity * ProductsList.unit_price_at_sale)
+    revenue_by_category_rows = (
+        db.query(category.label("category"), revenue.label("revenue"))
+        .join(ProductsList, ProductsList.product_id == Product.id)
+        .group_by(category)
+        .order_by(revenue.desc(), category)
+        .all()
+    )
+    revenue_by_category = [
+        {
+            "category": row.category,
+            "revenue": round(float(row.revenue or 0), 2),
+        }
+        for row in revenue_by_category_rows
+    ]
+
+    return {
+        "average_basket": average_basket,
+        "stock_rupture_rate": stock_rupture_rate,
+        "top_products": top_products,
+        "revenue_by_category": revenue_by_category,
+        "total_invoices": total_invoices,
+        "total_products": total_products,
+    }
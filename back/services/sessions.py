@@ -0,0 +1,86 @@
+"""Refresh token sessions.
+
+A refresh token is "<session id>.<secret>". Each session is one row holding
+the SHA-256 of its current secret, replaced on every exchange (rotation):
+presenting an already rotated secret means the token leaked, and the session
+is revoked.
+"""
+
+import hashlib
+import hmac
+import os
+import secrets
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from models import User, UserSession
+
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("TRINITY_REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+
+
+def _hash_secret(secret: str) -> bytes:
+    return hashlib.sha256(secret.encode()).digest()
+
+
+def _new_secret():
+    secret = secrets.token_urlsafe(32)
+    return secret, _hash_secret(secret), datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+
+
+def create_session(db: Session, user_id: int) -> str:
+    """Opens a session and returns its refresh token; commit is left to the caller."""
+    session_id = secrets.token_hex(16)
+    secret, token_hash, expires_at = _new_secret()
+    db.add(UserSession(id=session_id, user_id=user_id, token_hash=token_hash, expires_at=expires_at))
+    return f"{session_id}.{secret}"
+
+
+def rotate_session(db: Session, refresh_token: str) -> Optional[tuple]:
+    """Exchanges a refresh token for (user, new refresh token), or None if it is
+    invalid, expired or replayed. Commits."""
+    session_id, _, secret = refresh_token.partition(".")
+    row = (
+        db.query(UserSession, User)
+        .join(User, User.id == UserSession.user_id)
+        .filter(UserSession.id == session_id)
+        .first()
+    )
+    if row is None:
+        return None
+    session, user = row
+
+    if not hmac.compare_digest(session.token_hash, _hash_secret(secret)):
+        # Reuse of a rotated token: whoever holds the current one is revoked too.
+        db.query(UserSession).filter(UserSession.id == session_id).delete()
+        db.commit()
+        return None
+    if session.expires_at < datetime.utcnow():
+        db.query(UserSession).filter(UserSession.id == session_id).delete()
+        db.commit()
+        return None
+
+    new_secret, new_hash, expires_at = _new_secret()
+    # Compare-and-swap on the old hash so two concurrent exchanges of the same
+    # token cannot both succeed.
+    rotated = (
+        db.query(UserSession)
+        .filter(UserSession.id == session_id, UserSession.token_hash == session.token_hash)
+        .update({"token_hash": new_hash, "expires_at": expires_at}, synchronize_session=False)
+    )
+    db.commit()
+    if not rotated:
+        return None
+    return user, f"{session_id}.{new_secret}"
+
+
+def revoke_session(db: Session, refresh_token: str):
+    session_id, _, secret = refresh_token.partition(".")
+    db.query(UserSession).filter(
+        UserSession.id == session_id, UserSession.token_hash == _hash_secret(secret)
+    ).delete(synchronize_session=False)
+
+
+def revoke_user_sessions(db: Session, user_id: int):
+    db.query(UserSession).filter(UserSession.user_id == user_id).delete(synchronize_session=False)
@@ -0,0 +1,137 @@
+"""Per-request SQL statistics: statement count, DB time and repeated statements.
+
+Cursor events on every engine add to the statistics of the request being
+served (a context variable set by SQLMetricsMiddleware), which are sent back
+in a Server-Timing header:
+
+    Server-Timing: db;dur=12.4;desc="7 SQL", app;dur=31.0
+
+Requests slower than TRINITY_SLOW_REQUEST_MS or running more than
+TRINITY_SLOW_REQUEST_QUERIES statements are logged, as are statement shapes
+(the SQL with IN lists collapsed) executed more than TRINITY_SQL_REPEAT_LIMIT
+times in one request: the N+1 signature. With TRINITY_SQL_STRICT=1 (tests,
+benchmarks) the statement that goes over the limit raises RepeatedQueryError
+instead.
+"""
+
+import logging
+import os
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+
+from db import POOLS
+
+SLOW_REQUEST_MS = float(os.getenv("TRINITY_SLOW_REQUEST_MS", "500"))
+SLOW_REQUEST_QUERIES = int(os.getenv("TRINITY_SLOW_REQUEST_QUERIES", "20"))
+SQL_REPEAT_LIMIT = int(os.getenv("TRINITY_SQL_REPEAT_LIMIT", "10"))
+SQL_STRICT = os.getenv("TRINITY_SQL_STRICT", "0") == "1"
+
+logger = logging.getLogger("trinity.sql")
+
+# "(?, ?, ?)", "(%(id_1)s, %(id_2)s)" or "($1, $2)": selectinload and IN
+# filters vary in length with the data but are one statement shape.
+_PARAMETER_LIST = re.compile(r"\(\s*(?:\?|%\(\w+\)s|\$\d+)(?:\s*,\s*(?:\?|%\(\w+\)s|\$\d+))*\s*\)")
+
+
+class RepeatedQueryError(AssertionError):
+    pass
+
+
+def statement_shape(statement: str) -> str:
+    return _PARAMETER_LIST.sub("(?)", " ".join(statement.split()))
+
+
+class RequestQueries:
+    def __init__(self, repeat_limit: int = SQL_REPEAT_LIMIT, strict: bool = SQL_STRICT):
+        self.repeat_limit = repeat_limit
+        self.strict = strict
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+
+    def record(self, statement: str, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        shape = statement_shape(statement)
+        self.shapes[shape] += 1
+        if self.strict and self.shapes[shape] == self.repeat_limit + 1:
+            raise RepeatedQueryError(f"Requête exécutée plus de {self.repeat_limit} fois : {shape}")
+
+    def repeated(self) -> list:
+        return [(shape, count) for shape, count in self.shapes.most_common() if count > self.repeat_limit]
+
+
+current_queries: ContextVar[Optional[RequestQueries]] = ContextVar("current_queries", default=None)
+
+
+def instrument(engine):
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    # A connection runs one statement at a time, so one start time is enough.
+    # A statement that raises leaves its time behind: the next one overwrites it.
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        if current_queries.get() is not None:
+            conn.info["query_started"] = time.perf_counter()
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def record_query(conn, cursor, statement, parameters, context, executemany):
+        queries = current_queries.get()
+        started = conn.info.pop("query_started", None)
+        if queries is not None and started is not None:
+            queries.record(statement, time.perf_counter() - started)
+
+
+for _pool in POOLS.values():
+    instrument(_pool["engine"])
+
+
+class SQLMetricsMiddleware:
+    """ASGI middleware: Server-Timing header and slow-request / N+1 log lines."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        queries = RequestQueries()
+        token = current_queries.set(queries)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                timing = f'db;dur={queries.seconds * 1000:.1f};desc="{queries.count} SQL", app;dur={elapsed_ms:.1f}'
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", timing.encode()),
+                    (b"timing-allow-origin", b"*"),
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_queries.reset(token)
+            self.report(scope, queries, (time.perf_counter() - started) * 1000)
+
+    @staticmethod
+    def report(scope, queries: RequestQueries, elapsed_ms: float):
+        route = f"{scope['method']} {scope['path']}"
+        if elapsed_ms > SLOW_REQUEST_MS or queries.count > SLOW_REQUEST_QUERIES:
+            logger.warning(
+                "Requête lente %s : %.0f ms, %d requêtes SQL (%.0f ms)",
+                route,
+                elapsed_ms,
+                queries.count,
+                queries.seconds * 1000,
+            )
+        for shape, count in queries.repeated():
+            logger.warning("N+1 probable sur %s : %d exécutions de %s", route, count, shape[:300])
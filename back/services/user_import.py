@@ -0,0 +1,130 @@
+"""Bulk creation of customer accounts from a CSV file.
+
+The CSV needs `email` and `password` columns; first_name, last_name, role,
+phone_number, address, zip_code, city and country are optional. Rows are read
+in batches: each batch is checked against the users table with one IN query,
+its passwords are hashed in the process pool and it is inserted in its own
+transaction, so a failure only loses the current batch. An email registered
+between the check and the insert is reported on its row and the rest of the
+batch is inserted again.
+"""
+
+import csv
+import io
+import re
+import time
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from models import User
+from services.password_pool import hash_passwords
+
+IMPORT_BATCH_SIZE = 1000
+ROLES = {"client", "manager"}
+OPTIONAL_FIELDS = ("phone_number", "address", "zip_code", "city", "country")
+EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+def _check_row(row: dict):
+    email = (row.get("email") or "").strip()
+    if not EMAIL_PATTERN.match(email):
+        return None, "email invalide"
+    if not row.get("password"):
+        return None, "mot de passe manquant"
+    role = (row.get("role") or "client").strip()
+    if role not in ROLES:
+        return None, f"rôle inconnu : {role}"
+    user = {
+        "email": email,
+        "password": row["password"],
+        "first_name": (row.get("first_name") or "").strip(),
+        "last_name": (row.get("last_name") or "").strip(),
+        "role": role,
+    }
+    for field in OPTIONAL_FIELDS:
+        user[field] = (row.get(field) or "").strip() or None
+    return user, None
+
+
+def _import_batch(db: Session, batch: list, seen: set, report: dict):
+    """`batch` holds (line number, user dict) pairs that passed _check_row."""
+    emails = [user["email"] for _, user in batch]
+    existing = {email for (email,) in db.query(User.email).filter(User.email.in_(emails))}
+
+    rows = []
+    for line, user in batch:
+        if user["email"] in existing:
+            report["errors"].append({"line": line, "email": user["email"], "error": "email déjà utilisé"})
+        elif user["email"] in seen:
+            report["errors"].append({"line": line, "email": user["email"], "error": "email en double dans le fichier"})
+        else:
+            seen.add(user["email"])
+            rows.append((line, user))
+    if not rows:
+        return
+
+    started = time.perf_counter()
+    for (_, user), hashed in zip(rows, hash_passwords([user["password"] for _, user in rows])):
+        user["password"] = hashed
+    report["hash_seconds"] += time.perf_counter() - started
+
+    try:
+        _insert(db, rows)
+    except IntegrityError:
+        # Emails registered since the IN query: report them, insert the others.
+        db.rollback()
+        emails = [user["email"] for _, user in rows]
+        taken = {email for (email,) in db.query(User.email).filter(User.email.in_(emails))}
+        for line, user in rows:
+            if user["email"] in taken:
+                report["errors"].append({"line": line, "email": user["email"], "error": "email déjà utilisé"})
+        rows = [(line, user) for line, user in rows if user["email"] not in taken]
+        try:
+            _insert(db, rows)
+        except IntegrityError:
+            db.rollback()
+            for line, user in rows:
+                report["errors"].append({"line": line, "email": user["email"], "error": "insertion impossible"})
+            return
+    report["created"] += len(rows)
+
+
+def _insert(db: Session, rows: list):
+    if rows:
+        db.execute(insert(User), [user for _, user in rows])
+    db.commit()
+
+
+def import_users(db: Session, stream, batch_size: int = IMPORT_BATCH_SIZE) -> dict:
+    """Imports the CSV in the binary `stream`; returns the per-row report."""
+    started = time.perf_counter()
+    report = {"rows": 0, "created": 0, "errors": [], "hash_seconds": 0.0}
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8-sig", newline=""))
+    missing = {"email", "password"} - set(reader.fieldnames or [])
+    if missing:
+        raise ValueError(f"Colonnes manquantes : {', '.join(sorted(missing))}")
+
+    seen = set()
+    batch = []
+    for line, row in enumerate(reader, start=2):
+        report["rows"] += 1
+        user, error = _check_row(row)
+        if error:
+            report["errors"].append({"line": line, "email": row.get("email"), "error": error})
+            continue
+        batch.append((line, user))
+        if len(batch) >= batch_size:
+            _import_batch(db, batch, seen, report)
+            batch = []
+    if batch:
+        _import_batch(db, batch, seen, report)
+
+    elapsed = time.perf_counter() - started
+    report["seconds"] = round(elapsed, 2)
+    report["hash_seconds"] = round(report["hash_seconds"], 2)
+    report["rows_per_second"] = round(report["rows"] / elapsed, 1) if elapsed else 0
+    report["failed"] = len(report["errors"])
+    report["errors"].sort(key=lambda error: error["line"])
+    return report
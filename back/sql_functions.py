@@ -0,0 +1,76 @@
+"""SQL expressions that SQLite and PostgreSQL spell differently.
+
+Each construct compiles to the SQLite form by default and has a PostgreSQL
+variant, so models and queries stay the same on both backends.
+"""
+
+from sqlalchemy import Date, Integer, String
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.functions import FunctionElement
+
+
+class day(FunctionElement):
+    """Calendar day of a DateTime column."""
+
+    type = Date()
+    inherit_cache = True
+
+
+@compiles(day)
+def _day(element, compiler, **kw):
+    return f"date({compiler.process(element.clauses, **kw)})"
+
+
+@compiles(day, "postgresql")
+def _day_postgresql(element, compiler, **kw):
+    return f"CAST({compiler.process(element.clauses, **kw)} AS DATE)"
+
+
+class epoch_day(FunctionElement):
+    """Days between 1970-01-01 and the day of a DateTime column."""
+
+    type = Integer()
+    inherit_cache = True
+
+
+@compiles(epoch_day)
+def _epoch_day(element, compiler, **kw):
+    return f"CAST(julianday(date({compiler.process(element.clauses, **kw)})) - 2440587.5 AS INTEGER)"
+
+
+@compiles(epoch_day, "postgresql")
+def _epoch_day_postgresql(element, compiler, **kw):
+    return f"(CAST({compiler.process(element.clauses, **kw)} AS DATE) - DATE '1970-01-01')"
+
+
+class nocase(FunctionElement):
+    """Case-insensitive form of a text column, for lowercase comparisons and indexes.
+
+    SQLite compares under the NOCASE collation. PostgreSQL lowercases and
+    compares bytewise ("C"), so prefix ranges can use a btree index.
+    """
+
+    type = String()
+    inherit_cache = True
+
+
+@compiles(nocase)
+def _nocase(element, compiler, **kw):
+    return f"{compiler.process(element.clauses, **kw)} COLLATE NOCASE"
+
+
+@compiles(nocase, "postgresql")
+def _nocase_postgresql(element, compiler, **kw):
+    return f'lower({compiler.process(element.clauses, **kw)}) COLLATE "C"'
+
+
+def insert_missing(db: Session, model, **values) -> bool:
+    """INSERT ... ON CONFLICT DO NOTHING of one `model` row; True when it was inserted.
+
+    Concurrent transactions creating the same row then wait for each other
+    instead of one failing on the primary key.
+    """
+    insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    return db.execute(insert(model).values(**values).on_conflict_do_nothing()).rowcount == 1
@@ -0,0 +1,84 @@
+"""Test setup: the app runs against TRINITY_DATABASE_URL, a temporary SQLite
+file by default, so the same tests check PostgreSQL too.
+
+Usage (from back/):
+    python -m pytest unit_test
+    TRINITY_DATABASE_URL=postgresql+psycopg://trinity@localhost/trinity_test python -m pytest unit_test
+
+The database's tables are dropped and recreated: never point it at real data.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.append(str(ROOT))
+
+# Read by the modules below when they are imported.
+os.environ.setdefault("TRINITY_DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'trinity_test.db')}")
+os.environ.setdefault("TRINITY_SQL_STRICT", "1")
+os.environ.setdefault("TRINITY_HASH_WORKERS", "0")
+
+import pytest
+from fastapi.testclient import TestClient
+
+import models
+from db import SessionLocal, engine
+from main import app
+from migrations import operations, upgrade
+from services.auth_logic import access_token_claims, create_access_token
+from services.cache import CACHES
+
+
+@pytest.fixture(scope="session")
+def database():
+    models.Base.metadata.drop_all(bind=engine)
+    operations.metadata.drop_all(bind=engine)
+    upgrade(engine)
+    return engine
+
+
+@pytest.fixture
+def db(database):
+    """A session on an emptied database."""
+    with database.begin() as conn:
+        for table in reversed(models.Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+    for cache in CACHES:
+        cache.clear()
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def client(db):
+    with TestClient(app) as client:
+        yield client
+
+
+def add_user(db, email: str, role: str = "client", **fields) -> models.User:
+    user = models.User(
+        email=email,
+        first_name=fields.pop("first_name", "Test"),
+        last_name=fields.pop("last_name", "Client"),
+        password="x",
+        role=role,
+        **fields,
+    )
+    db.add(user)
+    db.commit()
+    return user
+
+
+def auth_headers(db, user: models.User) -> dict:
+    return {"Authorization": f"Bearer {create_access_token(access_token_claims(db, user))}"}
+
+
+@pytest.fixture
+def manager(db):
+    user = add_user(db, "manager@test.local", role="manager", first_name="Alice", last_name="Manager")
+    return auth_headers(db, user)
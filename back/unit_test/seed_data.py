@@ -9,19 +9,24 @@ import random
 import sys
 from pathlib import Path
 
-from passlib.context import CryptContext
-
 ROOT = Path(__file__).resolve().parents[1]
 if str(ROOT) not in sys.path:
     sys.path.append(str(ROOT))
 
-from db import SessionLocal, Base, engine
+from db import SessionLocal, engine
 import models
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from migrations import upgrade
+from services.customer_sketches import rebuild_sketches
+from services.customer_stats import rebuild_customer_stats
+from services.passwords import pwd_context
 
 
 def reset_database(session):
+    session.query(models.CustomerCategorySpend).delete()
+    session.query(models.CustomerStats).delete()
+    session.query(models.DailyCustomerSketch).delete()
+    session.query(models.UserSession).delete()
+    session.query(models.UserTokenVersion).delete()
     session.query(models.ProductsList).delete()
     session.query(models.Invoice).delete()
     session.query(models.Product).delete()
@@ -127,13 +132,15 @@ def create_invoices(session, users, products):
 
 
 def main():
-    Base.metadata.create_all(bind=engine)
+    upgrade(engine)
     session = SessionLocal()
     try:
         reset_database(session)
         users = create_users(session)
         products = create_products(session)
         create_invoices(session, users, products)
+        rebuild_sketches(session)
+        rebuild_customer_stats(session)
         print("✅ Demo data generated")
         print("Manager login: manager@trinity.local / manager123")
         print("Client login: client1@trinity.local / client123")
@@ -0,0 +1,132 @@
+"""Checkout: stock, customer aggregates and daily sketches, alone and concurrently."""
+
+import threading
+from datetime import datetime
+
+import pytest
+
+import models
+import routes.invoices
+from services.customer_sketches import estimate_customers, exact_customers
+from services.customer_stats import rebuild_customer_stats
+from conftest import add_user, auth_headers
+
+BILLING = {
+    "first_name": "Bob",
+    "last_name": "Client",
+    "address": "1 rue de Paris",
+    "zip_code": "75001",
+    "city": "Paris",
+}
+
+
+@pytest.fixture(autouse=True)
+def paypal(monkeypatch):
+    monkeypatch.setattr(routes.invoices, "_paypal_capture_order", lambda order_id: {"status": "COMPLETED"})
+
+
+@pytest.fixture
+def products(db):
+    products = [
+        models.Product(name="Pommes", category="Fruits", price=2.0, available_quantity=1000),
+        models.Product(name="Pain", category=None, price=3.0, available_quantity=1000),
+    ]
+    db.add_all(products)
+    db.commit()
+    return [product.id for product in products]
+
+
+def checkout(client, headers, products, order_id):
+    items = [{"product_id": products[0], "quantity": 2}, {"product_id": products[1], "quantity": 1}]
+    response = client.post(
+        "/invoices/checkout", json={"items": items, "billing": BILLING, "paypal_order_id": order_id}, headers=headers
+    )
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def aggregates(db):
+    stats = {
+        row.user_id: (row.invoice_count, round(row.total_spent, 2), row.first_purchase_at, row.last_purchase_at)
+        for row in db.query(models.CustomerStats)
+    }
+    spend = {(row.user_id, row.category): round(row.revenue, 2) for row in db.query(models.CustomerCategorySpend)}
+    return stats, spend
+
+
+def test_checkout_updates_stock_and_aggregates(db, client, products):
+    customer = add_user(db, "bob@test.local")
+    # Bought before customer_stats existed: counted when the row is created.
+    db.add(models.Invoice(user_id=customer.id, total_price=4.0, created_at=datetime(2024, 1, 1)))
+    db.commit()
+
+    headers = auth_headers(db, customer)
+    for order in range(3):
+        assert checkout(client, headers, products, f"order-{order}")["total_price"] == 7.0
+
+    db.expire_all()
+    assert db.get(models.Product, products[0]).available_quantity == 994
+    stats = db.get(models.CustomerStats, customer.id)
+    assert (stats.invoice_count, stats.total_spent) == (4, 25.0)
+    assert stats.first_purchase_at == datetime(2024, 1, 1)
+
+    live = aggregates(db)
+    rebuild_customer_stats(db)
+    assert aggregates(db) == live
+
+
+def test_concurrent_checkouts_add_up(db, client, products):
+    customers = [add_user(db, f"client{i}@test.local") for i in range(3)]
+    # Two threads per customer: same customer_stats row, same day's sketch row.
+    jobs = [(auth_headers(db, customer), f"{customer.id}-{thread}") for customer in customers for thread in range(2)]
+    errors = []
+
+    def run(headers, prefix):
+        try:
+            for order in range(5):
+                checkout(client, headers, products, f"{prefix}-{order}")
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=run, args=job) for job in jobs]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+
+    db.expire_all()
+    assert db.get(models.Product, products[0]).available_quantity == 1000 - 2 * 30
+    live = aggregates(db)
+    assert {count for count, *_ in live[0].values()} == {10}
+    rebuild_customer_stats(db)
+    assert aggregates(db) == live
+    assert estimate_customers(db)["customers_with_purchases"] == exact_customers(db)["customers_with_purchases"] == 3
+
+
+def test_concurrent_checkouts_never_oversell(db, client):
+    product = models.Product(name="Truffes", category="Épicerie", price=50.0, available_quantity=5)
+    db.add(product)
+    db.commit()
+    headers = [auth_headers(db, add_user(db, f"client{i}@test.local")) for i in range(8)]
+    statuses = []
+
+    def run(index):
+        items = [{"product_id": product.id, "quantity": 1}]
+        response = client.post(
+            "/invoices/checkout",
+            json={"items": items, "billing": BILLING, "paypal_order_id": f"truffes-{index}"},
+            headers=headers[index],
+        )
+        statuses.append(response.status_code)
+
+    threads = [threading.Thread(target=run, args=(index,)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    db.expire_all()
+    assert sorted(statuses) == [200] * 5 + [400] * 3
+    assert db.get(models.Product, product.id).available_quantity == 0
+    assert db.query(models.Invoice).count() == 5
@@ -0,0 +1,76 @@
+"""DuckDB report backend checked against the SQL path, without the sqlite extension.
+
+The DuckDB tables are copied from the session into memory, then read either
+directly or through the Parquet snapshot written by DuckDB itself.
+"""
+
+import random
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+import models
+import services.duckdb_reports as duckdb_reports
+from services.customer_sketches import exact_customers
+from services.reports_logic import kpi_summary
+from conftest import add_user
+
+pytest.importorskip("duckdb")
+
+TODAY = date.today()
+WINDOWS = [
+    (None, None),
+    (TODAY - timedelta(days=7), None),
+    (TODAY - timedelta(days=30), TODAY - timedelta(days=7)),
+    (None, TODAY - timedelta(days=30)),
+    (TODAY - timedelta(days=60), TODAY - timedelta(days=60)),
+]
+
+
+def seed_history(db, seed: int):
+    """Random shop: some products without a category or out of stock, some
+    guest invoices. Prices are quarters so both backends sum them exactly."""
+    rng = random.Random(seed)
+    products = [
+        models.Product(
+            name=f"Produit {i}",
+            category=rng.choice(["Fruits", "Épicerie", "Boissons", None]),
+            price=rng.randint(1, 40) / 4,
+            available_quantity=rng.choice([0, 0, 3, 10, 50]),
+        )
+        for i in range(12)
+    ]
+    db.add_all(products)
+    customers = [add_user(db, f"client{i}@test.local").id for i in range(15)]
+    for _ in range(120):
+        lines = [
+            models.ProductsList(product_id=product.id, quantity=rng.randint(1, 4), unit_price_at_sale=product.price)
+            for product in rng.sample(products, rng.randint(1, 4))
+        ]
+        created_at = datetime.combine(TODAY - timedelta(days=rng.randint(0, 90)), time(rng.randint(0, 23)))
+        invoice = models.Invoice(
+            user_id=rng.choice(customers + [None]),
+            total_price=sum(line.quantity * line.unit_price_at_sale for line in lines),
+            created_at=created_at,
+        )
+        invoice.details = lines
+        db.add(invoice)
+    db.commit()
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+@pytest.mark.parametrize("source", ["sqlite", "parquet"])
+def test_duckdb_matches_sql(db, seed, source, tmp_path, monkeypatch):
+    monkeypatch.setattr(duckdb_reports, "DUCKDB_SNAPSHOT_DIR", str(tmp_path))
+    seed_history(db, seed)
+    reports = duckdb_reports.DuckDBReports.from_session(db, source)
+
+    expected = kpi_summary(db)
+    assert len(expected["top_products"]) == 5
+    assert {row["category"] for row in expected["revenue_by_category"]} >= {"Non catégorisé"}
+    assert reports.kpi_summary() == expected
+    for start, end in WINDOWS:
+        assert reports.exact_customers(start, end) == exact_customers(db, start, end), (start, end)
+    if source == "parquet":
+        (snapshot,) = tmp_path.iterdir()
+        assert sorted(path.name for path in snapshot.iterdir()) == sorted(f"{table}.parquet" for table in duckdb_reports.TABLES)
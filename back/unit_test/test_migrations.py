@@ -0,0 +1,50 @@
+"""Upgrading a database stamped at an older version: indexes and backfills."""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import inspect, text
+
+import migrations.operations as operations
+import models
+from migrations import LATEST_VERSION, SchemaVersionError, check_schema, current_version, upgrade
+from services.customer_sketches import estimate_customers, exact_customers
+from conftest import add_user
+
+DROPPED_INDEXES = ("ix_users_email_nocase", "ix_customer_stats_total_spent", "ix_invoices_user_id_created_at")
+
+
+def index_names(engine, table: str) -> set:
+    return {index["name"] for index in inspect(engine).get_indexes(table)}
+
+
+def test_upgrade_from_version_1(db, database, monkeypatch):
+    monkeypatch.setattr(operations, "BACKFILL_PAUSE", 0)
+    customers = [add_user(db, f"client{i}@test.local").id for i in range(10)]
+    for i in range(40):
+        created_at = datetime(2024, 1, 1) + timedelta(days=i % 7)
+        db.add(models.Invoice(user_id=customers[i % 10], total_price=5.0, created_at=created_at))
+    db.commit()
+
+    # As a database from before steps 2 to 4: indexes missing, no aggregates, no sketches.
+    with database.begin() as conn:
+        for name in DROPPED_INDEXES:
+            conn.execute(text(f"DROP INDEX {name}"))
+    operations.write_version(database, 1)
+    assert "ix_users_email_nocase" not in index_names(database, "users")
+    # Startup doesn't migrate unless TRINITY_AUTO_MIGRATE=1.
+    with pytest.raises(SchemaVersionError, match="python -m migrations upgrade"):
+        check_schema(database)
+
+    assert upgrade(database) == current_version(database) == LATEST_VERSION
+
+    assert "ix_users_email_nocase" in index_names(database, "users")
+    assert "ix_customer_stats_total_spent" in index_names(database, "customer_stats")
+    assert "ix_invoices_user_id_created_at" in index_names(database, "invoices")
+    db.expire_all()
+    assert db.query(models.CustomerStats).count() == 10
+    estimate, exact = estimate_customers(db), exact_customers(db)
+    assert (estimate["customers_with_purchases"], estimate["repeat_customers"]) == (10, 10)
+    assert (exact["customers_with_purchases"], exact["repeat_customers"]) == (10, 10)
+    with database.connect() as conn:
+        assert conn.execute(operations.backfill_progress.select()).first() is None
@@ -0,0 +1,52 @@
+"""Password pool: bulk chunks share the slots of run() calls, queued jobs are counted."""
+
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+import services.password_pool as password_pool
+
+
+def test_bulk_chunks_hold_slots(monkeypatch):
+    monkeypatch.setattr(password_pool, "HASH_TIMEOUT", 0.01)
+    pool = password_pool.PasswordPool(workers=0, queue_size=1)
+    seen = []
+
+    def chunk_job(chunk):
+        seen.append(pool.stats()["in_flight"])
+        # The bulk chunk holds the only slot: a login is turned away meanwhile.
+        with pytest.raises(HTTPException) as rejected:
+            pool.run(lambda: (None, 0.0))
+        assert rejected.value.status_code == 429
+        return chunk, 0.0
+
+    assert pool.run_chunks(chunk_job, [1, 2]) == [1, 2]
+    assert seen == [1, 1]
+    stats = pool.stats()
+    assert (stats["in_flight"], stats["rejected"], stats["bulk_chunks"]) == (0, 2, 2)
+
+    # And bulk work waits for a slot, then gives up with 503.
+    pool.slots.acquire()
+    with pytest.raises(HTTPException) as unavailable:
+        pool.run_chunks(chunk_job, [3])
+    assert unavailable.value.status_code == 503
+
+
+def test_queued_counts_jobs_no_worker_started():
+    pool = password_pool.PasswordPool(workers=1, queue_size=4)
+    threads = [threading.Thread(target=pool.run, args=(password_pool._timed, time.sleep, 0.5)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 10
+    # Once the worker is up: one job running, two waiting for it.
+    while (pool.stats()["in_flight"], pool.stats()["queued"]) != (3, 2) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    stats = pool.stats()
+    assert (stats["in_flight"], stats["queued"]) == (3, 2)
+    for thread in threads:
+        thread.join()
+    stats = pool.stats()
+    assert (stats["in_flight"], stats["queued"], stats["completed"]) == (0, 0, 3)
+    pool.executor.shutdown()
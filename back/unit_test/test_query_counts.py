@@ -0,0 +1,75 @@
+"""Query-count budgets of the manager user routes.
+
+A customer's history grows from 5 to 205 invoices: each route must stay
+within its budget and run no more statements with the larger history. The
+N+1 detector runs in strict mode (see conftest), so a statement repeated more
+than TRINITY_SQL_REPEAT_LIMIT times in one request fails the request.
+"""
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+import models
+from db import POOLS
+from services.customer_stats import rebuild_customer_stats
+from conftest import add_user
+
+BUDGETS = {
+    "/users?limit=50": 1,
+    "/users/{customer}": 3,
+    "/users/{customer}?limit=100": 3,
+}
+
+
+def add_invoices(db, customer_id: int, products: list, count: int, start: datetime):
+    for i in range(count):
+        invoice = models.Invoice(user_id=customer_id, total_price=10.0, created_at=start + timedelta(hours=i))
+        invoice.details = [
+            models.ProductsList(product_id=products[(i + j) % len(products)], quantity=1, unit_price_at_sale=5.0)
+            for j in range(2)
+        ]
+        db.add(invoice)
+    db.commit()
+    rebuild_customer_stats(db)
+
+
+def count_queries(client, headers: dict, url: str) -> int:
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    engines = [getattr(pool["engine"], "sync_engine", pool["engine"]) for pool in POOLS.values()]
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.get(url, headers=headers)
+        response.raise_for_status()
+    finally:
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", record)
+    return len(statements)
+
+
+def test_user_routes_stay_within_budget(db, client, manager):
+    customer = add_user(db, "bob@test.local").id
+    products = [
+        models.Product(name=f"Produit {i}", category=f"Rayon {i % 3}", price=5.0, available_quantity=10)
+        for i in range(20)
+    ]
+    db.add_all(products)
+    db.commit()
+    product_ids = [product.id for product in products]
+
+    previous = None
+    start = datetime(2024, 1, 1)
+    for invoices in (5, 200):
+        add_invoices(db, customer, product_ids, invoices, start)
+        start += timedelta(days=30)
+        counts = {url: count_queries(client, manager, url.format(customer=customer)) for url in BUDGETS}
+        for url, count in counts.items():
+            assert count <= BUDGETS[url], f"{url} : {count} requêtes, budget {BUDGETS[url]}"
+            if previous is not None:
+                assert count <= previous[url], f"{url} : {previous[url]} puis {count} requêtes"
+        previous = counts
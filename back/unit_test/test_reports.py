@@ -0,0 +1,101 @@
+"""Manager reports on a small known history: KPIs, customer counts, analytics and cohorts."""
+
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+import models
+import services.analytics_store as analytics_store
+from services.customer_sketches import rebuild_sketches
+from services.customer_stats import rebuild_customer_stats
+from conftest import add_user
+
+TODAY = date.today()
+
+
+def days_ago(days: int) -> datetime:
+    return datetime.combine(TODAY - timedelta(days=days), time(12))
+
+
+@pytest.fixture
+def history(db):
+    """Four customers: the first buys 40, 20 and 3 days ago, the second 20 days
+    ago, the third twice 3 days ago, the last never. Every basket is 2 apples
+    and 1 bread (7.00); apples are out of stock."""
+    apples = models.Product(name="Pommes", category="Fruits", price=2.0, available_quantity=0)
+    bread = models.Product(name="Pain", category=None, price=3.0, available_quantity=5)
+    db.add_all([apples, bread])
+    customers = [add_user(db, f"client{i}@test.local") for i in range(4)]
+    purchases = [(0, 40), (0, 20), (0, 3), (1, 20), (2, 3), (2, 3)]
+    for customer, days in purchases:
+        invoice = models.Invoice(user_id=customers[customer].id, total_price=7.0, created_at=days_ago(days))
+        invoice.details = [
+            models.ProductsList(product_id=apples.id, quantity=2, unit_price_at_sale=2.0),
+            models.ProductsList(product_id=bread.id, quantity=1, unit_price_at_sale=3.0),
+        ]
+        db.add(invoice)
+    db.commit()
+    rebuild_customer_stats(db)
+    rebuild_sketches(db)
+    return apples.id, bread.id
+
+
+def test_kpi_report(client, manager, history):
+    apples, bread = history
+    report = client.get("/reports", headers=manager).json()
+    assert report["average_basket"] == 7.0
+    assert report["stock_rupture_rate"] == 50.0
+    assert report["customer_loyalty_rate"] == 66.67
+    assert report["top_products"] == [
+        {"product_id": apples, "name": "Pommes", "total_sold": 12},
+        {"product_id": bread, "name": "Pain", "total_sold": 6},
+    ]
+    assert report["revenue_by_category"] == [
+        {"category": "Fruits", "revenue": 24.0},
+        {"category": "Non catégorisé", "revenue": 18.0},
+    ]
+    assert report["meta"]["total_invoices"] == 6
+
+
+@pytest.mark.parametrize(
+    "window, expected",
+    [
+        ({}, (3, 2)),
+        ({"start_date": str(TODAY - timedelta(days=7))}, (2, 2)),
+        ({"end_date": str(TODAY - timedelta(days=10))}, (2, 1)),
+        ({"start_date": str(TODAY - timedelta(days=30)), "end_date": str(TODAY - timedelta(days=10))}, (2, 1)),
+    ],
+)
+@pytest.mark.parametrize("mode", ["exact", "approx"])
+def test_customer_counts(client, manager, history, window, expected, mode):
+    report = client.get("/reports", params={**window, "customer_count_mode": mode}, headers=manager).json()
+    customers = report["meta"]["customers"]
+    assert (customers["customers_with_purchases"], customers["repeat_customers"]) == expected
+
+
+def test_analytics_match_sql(client, manager, history, monkeypatch):
+    sql = client.get("/reports/analytics", headers=manager).json()
+    assert sql["meta"]["engine"] == "sql"
+    assert sql["basket_size_distribution"]["distribution"] == [{"items": 3, "invoices": 6}]
+
+    monkeypatch.setattr(analytics_store, "ANALYTICS_ENGINE", "numpy")
+    monkeypatch.setattr(analytics_store, "_store", None)
+    columnar = client.get("/reports/analytics", headers=manager).json()
+    assert columnar["meta"]["engine"] == "numpy"
+    assert columnar["basket_size_distribution"] == sql["basket_size_distribution"]
+    assert columnar["revenue_per_category_week"] == sql["revenue_per_category_week"]
+
+
+def test_cohorts(client, manager, history):
+    response = client.get("/reports/cohorts", params={"weeks": 8, "cohorts": 12}, headers=manager)
+    assert response.status_code == 200, response.text
+    cohorts = [cohort for cohort in response.json()["cohorts"] if cohort["customers"]]
+    assert sum(cohort["customers"] for cohort in cohorts) == 3
+    assert all(cohort["retention"][0] == 1.0 for cohort in cohorts)
+
+
+def test_column_scans_are_counted(client, manager, history):
+    # The cohort report reads through column_chunks, outside the ORM.
+    response = client.get("/reports/cohorts", headers=manager)
+    timing = dict(part.strip().split(";", 1) for part in response.headers["server-timing"].split(","))
+    assert 'desc="2 SQL"' in timing["db"]
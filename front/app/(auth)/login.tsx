@@ -32,7 +32,7 @@ export default function LoginScreen() {
         const token = String(data.access_token);
         console.log("Token valide extrait, stockage...");
         
-        await signIn(token, { role: data.role });
+        await signIn(token, { role: data.role }, data.refresh_token);
 
         setTimeout(() => {
           router.replace(data.role === 'manager' ? '/(tabs)/dashboard' : '/(tabs)/home');
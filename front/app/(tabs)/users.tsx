@@ -4,9 +4,13 @@ import { createUserByManager, deleteUserByManager, getUserDetail, listUsers, upd
 
 export default function UsersManagementScreen() {
   const [users, setUsers] = useState<any[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
   const [query, setQuery] = useState('');
+  const [sortBy, setSortBy] = useState<'created' | 'ltv' | 'recency' | 'orders'>('created');
   const [selectedUser, setSelectedUser] = useState<any>(null);
   const [history, setHistory] = useState<any[]>([]);
+  const [historyCursor, setHistoryCursor] = useState<string | null>(null);
+  const [aggregates, setAggregates] = useState<any>(null);
   const [detailVisible, setDetailVisible] = useState(false);
   const [createVisible, setCreateVisible] = useState(false);
   const [form, setForm] = useState<any>({
@@ -19,12 +23,24 @@ export default function UsersManagementScreen() {
 
   const fetchUsers = useCallback(async () => {
     try {
-      const data = await listUsers(query ? { q: query } : undefined);
-      setUsers(data || []);
+      const data = await listUsers({ ...(query ? { q: query } : {}), sort_by: sortBy });
+      setUsers(data?.items || []);
+      setNextCursor(data?.next_cursor || null);
     } catch {
       Alert.alert('Erreur', 'Impossible de charger les utilisateurs');
     }
-  }, [query]);
+  }, [query, sortBy]);
+
+  const fetchMoreUsers = async () => {
+    if (!nextCursor) return;
+    try {
+      const data = await listUsers({ ...(query ? { q: query } : {}), sort_by: sortBy, cursor: nextCursor });
+      setUsers((current) => [...current, ...(data?.items || [])]);
+      setNextCursor(data?.next_cursor || null);
+    } catch {
+      Alert.alert('Erreur', 'Impossible de charger les utilisateurs');
+    }
+  };
 
   useEffect(() => {
     fetchUsers();
@@ -34,13 +50,26 @@ export default function UsersManagementScreen() {
     try {
       const detail = await getUserDetail(user.id);
       setSelectedUser(detail.user);
+      setAggregates(detail.aggregates);
       setHistory(detail.purchase_payment_history || []);
+      setHistoryCursor(detail.next_cursor || null);
       setDetailVisible(true);
     } catch {
       Alert.alert('Erreur', 'Impossible de charger le détail utilisateur');
     }
   };
 
+  const fetchMoreHistory = async () => {
+    if (!selectedUser || !historyCursor) return;
+    try {
+      const detail = await getUserDetail(selectedUser.id, { cursor: historyCursor });
+      setHistory((current) => [...current, ...(detail.purchase_payment_history || [])]);
+      setHistoryCursor(detail.next_cursor || null);
+    } catch {
+      Alert.alert('Erreur', 'Impossible de charger le détail utilisateur');
+    }
+  };
+
   const handleCreate = async () => {
     if (!form.email || !form.password) {
       Alert.alert('Erreur', 'Email et mot de passe requis');
@@ -92,6 +121,14 @@ export default function UsersManagementScreen() {
         <TouchableOpacity style={styles.btn} onPress={fetchUsers}><Text style={styles.btnText}>Chercher</Text></TouchableOpacity>
       </View>
 
+      <View style={styles.searchRow}>
+        {([['created', 'Récents'], ['ltv', 'Valeur'], ['recency', 'Activité'], ['orders', 'Commandes']] as const).map(([key, label]) => (
+          <TouchableOpacity key={key} onPress={() => setSortBy(key)}>
+            <Text style={[styles.link, sortBy === key ? {} : { color: '#666' }]}>{label}</Text>
+          </TouchableOpacity>
+        ))}
+      </View>
+
       <TouchableOpacity style={[styles.btn, { marginBottom: 12 }]} onPress={() => setCreateVisible(true)}>
         <Text style={styles.btnText}>Créer un utilisateur</Text>
       </TouchableOpacity>
@@ -99,10 +136,15 @@ export default function UsersManagementScreen() {
       <FlatList
         data={users}
         keyExtractor={(item) => item.id.toString()}
+        onEndReached={fetchMoreUsers}
+        onEndReachedThreshold={0.5}
         renderItem={({ item }) => (
           <View style={styles.card}>
             <Text style={styles.name}>{item.first_name} {item.last_name}</Text>
             <Text style={styles.meta}>{item.email} • {item.role}</Text>
+            {item.invoice_count ? (
+              <Text style={styles.meta}>{Number(item.total_spent).toFixed(2)} € • {item.invoice_count} commande(s)</Text>
+            ) : null}
             <View style={styles.actions}>
               <TouchableOpacity onPress={() => openDetail(item)}><Text style={styles.link}>Historique</Text></TouchableOpacity>
               <TouchableOpacity onPress={() => handleRoleToggle(item)}><Text style={styles.link}>Basculer rôle</Text></TouchableOpacity>
@@ -116,8 +158,15 @@ export default function UsersManagementScreen() {
         <View style={styles.modalContainer}>
           <Text style={styles.title}>Historique utilisateur</Text>
           {selectedUser && <Text style={styles.meta}>{selectedUser.email}</Text>}
+          {aggregates && (
+            <Text style={styles.meta}>
+              {Number(aggregates.lifetime_spend).toFixed(2)} € • {aggregates.invoice_count} commande(s) • Rayon favori : {aggregates.favourite_category || 'N/A'}
+            </Text>
+          )}
           <FlatList
             data={history}
+            onEndReached={fetchMoreHistory}
+            onEndReachedThreshold={0.5}
             keyExtractor={(item) => item.invoice_id.toString()}
             renderItem={({ item }) => (
               <View style={styles.card}>
@@ -17,9 +17,40 @@ apiClient.interceptors.request.use(async (config) => {
   return config;
 });
 
+const NO_REFRESH_URLS = ['/auth/login', '/auth/refresh', '/auth/logout'];
+
+// Un seul échange à la fois : le refresh token est à usage unique.
+let refreshing: Promise<string | null> | null = null;
+
+const refreshAccessToken = async (): Promise<string | null> => {
+  const refreshToken = await tokenStorage.getItem('refreshToken');
+  if (!refreshToken) return null;
+  try {
+    const response = await axios.post(`${BASE_URL}/auth/refresh`, { refresh_token: refreshToken });
+    await tokenStorage.setItem('userToken', response.data.access_token);
+    await tokenStorage.setItem('refreshToken', response.data.refresh_token);
+    return response.data.access_token;
+  } catch {
+    await tokenStorage.deleteItem('refreshToken');
+    return null;
+  }
+};
+
 apiClient.interceptors.response.use(
   (response) => response,
-  (error) => Promise.reject(error)
+  async (error) => {
+    const original = error.config;
+    if (error.response?.status !== 401 || !original || original._retried || NO_REFRESH_URLS.includes(original.url)) {
+      return Promise.reject(error);
+    }
+    original._retried = true;
+    refreshing = refreshing ?? refreshAccessToken().finally(() => { refreshing = null; });
+    const token = await refreshing;
+    if (!token) return Promise.reject(error);
+    original.headers = original.headers ?? {};
+    original.headers.Authorization = `Bearer ${token}`;
+    return apiClient(original);
+  }
 );
 
 export default apiClient;
\ No newline at end of file
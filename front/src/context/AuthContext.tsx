@@ -7,7 +7,7 @@ interface AuthContextType {
   userToken: string | null;
   user: any | null;
   isLoading: boolean;
-  signIn: (token: string, userData?: any) => Promise<void>;
+  signIn: (token: string, userData?: any, refreshToken?: string) => Promise<void>;
   signOut: () => Promise<void>;
 }
 
@@ -62,8 +62,11 @@ export function AuthProvider({ children }: { children: React.ReactNode }) {
     }
   }, [userToken, user, isLoading, segments, router]);
 
-  const signIn = async (token: string, userData?: any) => {
+  const signIn = async (token: string, userData?: any, refreshToken?: string) => {
     await tokenStorage.setItem('userToken', token);
+    if (refreshToken) {
+      await tokenStorage.setItem('refreshToken', refreshToken);
+    }
     setUserToken(token);
 
     let resolvedUser = userData;
@@ -79,6 +82,11 @@ export function AuthProvider({ children }: { children: React.ReactNode }) {
   };
 
   const signOut = async () => {
+    const refreshToken = await tokenStorage.getItem('refreshToken');
+    if (refreshToken) {
+      apiClient.post('/auth/logout', { refresh_token: refreshToken }).catch(() => {});
+      await tokenStorage.deleteItem('refreshToken');
+    }
     await tokenStorage.deleteItem('userToken');
     await tokenStorage.deleteItem('userData');
     setUserToken(null);
@@ -1,12 +1,19 @@
 import apiClient from '../api/client';
 
-export const listUsers = async (params?: { q?: string; role?: string }) => {
+export const listUsers = async (params?: {
+  q?: string;
+  role?: string;
+  segment?: 'new' | 'loyal' | 'at_risk' | 'lapsed';
+  sort_by?: 'created' | 'ltv' | 'recency' | 'orders';
+  cursor?: string;
+  limit?: number;
+}) => {
   const response = await apiClient.get('/users', { params });
   return response.data;
 };
 
-export const getUserDetail = async (userId: number) => {
-  const response = await apiClient.get(`/users/${userId}`);
+export const getUserDetail = async (userId: number, params?: { cursor?: string; limit?: number }) => {
+  const response = await apiClient.get(`/users/${userId}`, { params });
   return response.data;
 };
 